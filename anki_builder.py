@@ -5,48 +5,42 @@ genankiを使用したAnkiカードとデッキの生成
 """
 
 import os
+import time
+import uuid
 import genanki
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import logging
 
 import config
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=1)
+def _timestamp_for(epoch_sec: int) -> str:
+    """エポック秒からカード用タイムスタンプ文字列を生成（同一秒内はキャッシュを再利用）"""
+    return datetime.fromtimestamp(epoch_sec).strftime("%Y-%m-%d %H:%M:%S")
 
-class AnkiCardBuilder:
-    """Ankiカード構築クラス"""
-    
-    def __init__(self):
-        """初期化"""
-        self.model = self._create_anki_model()
-        self.deck = genanki.Deck(config.DECK_ID, config.DECK_NAME)
-        logger.info(f"Ankiデッキ作成完了: {config.DECK_NAME}")
-    
-    def _create_anki_model(self) -> genanki.Model:
-        """Ankiモデルを作成"""
-        return genanki.Model(
-            config.MODEL_ID,
-            '画像解説カード',
-            fields=[
-                {'name': 'Image'},
-                {'name': 'Description'},
-                {'name': 'Timestamp'},
-            ],
-            templates=[
-                {
-                    'name': 'Card 1',
-                    'qfmt': '''
+
+# カードのテンプレート・CSS（インスタンスごとに再生成しないようモジュール定数として保持）
+_FIELDS = [
+    {'name': 'Image'},
+    {'name': 'Description'},
+    {'name': 'Timestamp'},
+]
+
+_QFMT = '''
                     <div style="text-align: center; margin-bottom: 15px;">
                         {{Image}}
                     </div>
                     <div style="text-align: center; font-size: 11px; opacity: 0.7; margin-top: 10px;">
                         作成日時: {{Timestamp}}
                     </div>
-                    ''',
-                    'afmt': '''
+                    '''
+
+_AFMT = '''
                     {{FrontSide}}
                     <hr id="answer">
                     <div class="description">
@@ -74,15 +68,20 @@ class AnkiCardBuilder:
                         MathJax.Hub.Queue(["Typeset", MathJax.Hub]);
                     }
                     </script>
-                    ''',
-                },
-            ],
-            css=self._get_card_css()
-        )
-    
-    def _get_card_css(self) -> str:
-        """カードのCSSスタイルを取得"""
-        return """
+                    '''
+
+_TEMPLATES = [
+    {
+        'name': 'Card 1',
+        'qfmt': _QFMT,
+        'afmt': _AFMT,
+    },
+]
+
+# Geminiが生成したHTML解説文の目印
+_DESC_MARKER = '<div class="image-description">'
+
+_CARD_CSS = """
         /* ベーススタイル（ライトテーマ・ダークテーマ対応） */
         .card {
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
@@ -272,9 +271,37 @@ class AnkiCardBuilder:
             }
         }
         """
+
+
+@lru_cache(maxsize=4)
+def _build_model(model_id: int) -> genanki.Model:
+    """Ankiモデルを作成（同じMODEL_IDではプロセス内で共有し、設定の再読み込みで変わった場合は作り直す）"""
+    return genanki.Model(
+        model_id,
+        '画像解説カード',
+        fields=_FIELDS,
+        templates=_TEMPLATES,
+        css=_CARD_CSS
+    )
+
+
+class AnkiCardBuilder:
+    """Ankiカード構築クラス"""
+    
+    def __init__(self):
+        """初期化"""
+        self.model = self._create_anki_model()
+        self.deck = genanki.Deck(config.DECK_ID, config.DECK_NAME)
+        # 作成済みでデッキ未反映のノート（エクスポート時にまとめて追加）
+        self._pending_notes: List[genanki.Note] = []
+        logger.info(f"Ankiデッキ作成完了: {config.DECK_NAME}")
     
-    def create_card(self, image_path: str, description: str) -> Optional[str]:
-        """Ankiカードを作成"""
+    def _create_anki_model(self) -> genanki.Model:
+        """Ankiモデルを作成（MODEL_IDごとにキャッシュを返す）"""
+        return _build_model(config.MODEL_ID)
+    
+    def create_card(self, image_path: str, description: str, timestamp: Optional[str] = None) -> Optional[str]:
+        """Ankiカードを作成（timestamp省略時は現在時刻）"""
         try:
             # 画像ファイル名を取得
             image_filename = os.path.basename(image_path)
@@ -286,7 +313,8 @@ class AnkiCardBuilder:
             description_html = self._process_description(description)
             
             # タイムスタンプ
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if timestamp is None:
+                timestamp = _timestamp_for(int(time.time()))
             
             # Ankiノート作成
             note = genanki.Note(
@@ -294,8 +322,8 @@ class AnkiCardBuilder:
                 fields=[image_html, description_html, timestamp]
             )
             
-            self.deck.add_note(note)
-            logger.info(f"Ankiカード作成完了: {image_filename}")
+            self._pending_notes.append(note)
+            logger.debug(f"Ankiカード作成完了: {image_filename}")
             
             return image_filename
             
@@ -303,31 +331,54 @@ class AnkiCardBuilder:
             logger.error(f"Ankiカード作成エラー: {image_path} - {e}")
             return None
     
+    def create_cards(self, items: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """(画像パス, 解説文)の一覧からまとめてカードを作成（戻り値はcreate_cardと同じ形式の一覧）"""
+        # 一括作成のカードは同じ作成日時を共有
+        timestamp = _timestamp_for(int(time.time()))
+        return [self.create_card(image_path, description, timestamp) for image_path, description in items]
+    
     def _process_description(self, description: str) -> str:
         """解説文の処理（HTMLタグチェック等）"""
-        if '<div class="image-description">' in description:
+        if _DESC_MARKER in description:
             return description
         else:
             # HTMLタグがない場合の処理（フォールバック）
-            return f'<div class="image-description"><p>{description.replace(chr(10), "</p><p>")}</p></div>'
+            paragraphs = "</p><p>".join(description.splitlines())
+            return f'{_DESC_MARKER}<p>{paragraphs}</p></div>'
     
     def export_deck(self, output_path: str, media_files: Optional[List[str]] = None) -> None:
         """Ankiデッキをapkgファイルとしてエクスポート"""
+        # 一時ファイルに書き出してから置き換え、書き込み途中のapkgが見えないようにする（同時実行でも衝突しない名前）
+        temp_path = f"{output_path}.{uuid.uuid4().hex[:8]}.tmp"
         try:
+            self.flush_notes()
             package = genanki.Package(self.deck)
             
-            # メディアファイルがある場合は追加
+            # メディアファイルがある場合は追加（同一ファイルの重複書き込みを避ける）
             if media_files:
+                media_files = list(dict.fromkeys(media_files))
                 package.media_files = media_files
                 logger.info(f"メディアファイル追加: {len(media_files)}個")
             
-            package.write_to_file(output_path)
+            package.write_to_file(temp_path)
+            os.replace(temp_path, output_path)
             logger.info(f"Ankiデッキエクスポート完了: {output_path}")
             
         except Exception as e:
             logger.error(f"エクスポートエラー: {e}")
+            # 書き込み途中の一時ファイルを残さない（削除の失敗で元のエラーを隠さない）
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
             raise
     
+    def flush_notes(self) -> None:
+        """作成済みのノートをまとめてデッキに追加"""
+        if self._pending_notes:
+            self.deck.notes.extend(self._pending_notes)
+            self._pending_notes.clear()
+    
     def get_card_count(self) -> int:
         """デッキ内のカード数を取得"""
-        return len(self.deck.notes)
+        return len(self.deck.notes) + len(self._pending_notes)
@@ -4,8 +4,6 @@
 バッチ処理でAnkiカードを生成します
 """
 
-import sys
-import subprocess
 
 def main():
     """バッチ処理モードでメインプログラムを実行"""
@@ -14,9 +12,11 @@ def main():
     print("=" * 60)
     
     try:
-        # バッチ処理モードで実行
-        command = [sys.executable, "main.py", "--batch"]
-        result = subprocess.run(command, check=True)
+        # バッチ処理モードで実行（新しいPythonプロセスを起動せず、同一プロセス内で呼び出す）
+        from main import main as run_anki_main
+        exit_code = run_anki_main(["--batch"])
+        if exit_code != 0:
+            raise RuntimeError(f"終了コード {exit_code}")
         
         print("\n✅ バッチジョブの送信が完了しました！")
         print("⏳ Google Cloudでバッチ処理が実行されます（数分〜数時間）")
@@ -28,7 +28,7 @@ def main():
         
         return 0
         
-    except subprocess.CalledProcessError as e:
+    except (RuntimeError, SystemExit) as e:
         print(f"\n❌ バッチ処理エラー: {e}")
         return 1
     except Exception as e:
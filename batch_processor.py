@@ -4,29 +4,112 @@
 Vertex AI バッチ予測APIを使用したGeminiバッチ処理
 """
 
-import os
+import hashlib
+import importlib.util
 import json
+import mmap
+import os
+import threading
 import uuid
-import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 
-# バッチ処理用のインポート
+
+def _module_exists(name: str) -> bool:
+    """モジュールを読み込まずにインストール済みかを確認"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
+
+
+# バッチ処理用のパッケージ（読み込みに時間がかかるため、BatchProcessorの初期化時に読み込む）
+BATCH_PROCESSING_AVAILABLE = _module_exists('google.cloud.aiplatform') and _module_exists('google.cloud.storage')
+aiplatform = None
+storage = None
+
+# 高速JSONシリアライザ（利用できない場合は標準jsonを使用）
 try:
-    from google.cloud import aiplatform
-    from google.cloud import storage
-    BATCH_PROCESSING_AVAILABLE = True
+    import orjson
+    ORJSON_AVAILABLE = True
 except ImportError:
-    BATCH_PROCESSING_AVAILABLE = False
+    ORJSON_AVAILABLE = False
 
 import config
+from image_validator import get_mime_type, shrink_image
 
 logger = logging.getLogger(__name__)
 
 
+def _import_cloud_modules() -> None:
+    """バッチ処理用のGoogle Cloudパッケージを読み込む（読み込み済みなら何もしない）"""
+    global aiplatform, storage
+    if aiplatform is not None:
+        return
+    
+    from google.cloud import storage
+    
+    # 読み込み済みの判定に使うため最後に代入
+    from google.cloud import aiplatform
+
+# バッチジョブ状態確認のポーリング間隔（秒）：短いジョブは早く検知し、長いジョブはAPI呼び出しを減らす
+POLL_INITIAL_INTERVAL = 2.0
+POLL_MAX_INTERVAL = 60.0
+POLL_BACKOFF_FACTOR = 1.5
+
+
+def _hash_file(path: Path) -> str:
+    """ファイル内容のSHA-256ハッシュを計算（mmapでファイル全体をbytesに読み込まない）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        # 空ファイルはmmapできないため、そのまま空のハッシュを返す
+        if os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                digest.update(mm)
+    return digest.hexdigest()
+
+
+def _dumps(obj: Any) -> str:
+    """オブジェクトを1行のJSON文字列に変換（非ASCII文字はそのまま出力）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _loads(data: Any) -> Any:
+    """JSON文字列（またはバイト列）を解析"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def read_jsonl_blob(blob) -> List[Dict[str, Any]]:
+    """JSONLの結果ファイルを全体を文字列化せずに行単位で読み込み（解析できない行は読み飛ばす）"""
+    results = []
+    with blob.open("rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                results.append(_loads(line))
+            except ValueError as e:
+                logger.warning(f"JSON解析エラー: {e}")
+    return results
+
+
+def extract_response_text(result: Dict[str, Any]) -> Optional[str]:
+    """バッチ結果1件からGeminiの生成テキストを取り出す（取得できない場合はNone）"""
+    try:
+        return result["response"]["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
 class BatchProcessor:
     """Vertex AI バッチ処理管理クラス"""
     
@@ -34,17 +117,30 @@ class BatchProcessor:
         """初期化"""
         if not BATCH_PROCESSING_AVAILABLE:
             raise ImportError("バッチ処理パッケージが利用できません")
+        _import_cloud_modules()
         
         self.project_id = project_id
         self.location = location
         self.bucket_name = f"{project_id}-anki-batch-processing"
+        self._gs_prefix = f"gs://{self.bucket_name}/"
         
         # AI Platform 初期化
         aiplatform.init(project=project_id, location=location)
         self.storage_client = storage.Client()
-        self._ensure_bucket_exists()
+        self.bucket = self._ensure_bucket_exists()
+        
+        # 内容ハッシュ名でアップロード済みの画像（blob名 → アップロード時刻）
+        self._upload_cache_path = Path(config.UPLOAD_CACHE_PATH)
+        self._uploaded = self._load_upload_cache()
+        self._uploaded_lock = threading.Lock()
+        
+        # 画像の縮小（全体のデコード）の同時実行数（複数チャンクの並列準備でもBATCH_UPLOAD_WORKERSまでに抑える）
+        self._shrink_slots = threading.BoundedSemaphore(config.BATCH_UPLOAD_WORKERS)
+        
+        # ジョブ状態取得用クライアント（初回使用時に作成して使い回す）
+        self._job_client = None
     
-    def _ensure_bucket_exists(self) -> None:
+    def _ensure_bucket_exists(self) -> "storage.Bucket":
         """バッチ処理用のCloud Storageバケットを確保"""
         try:
             bucket = self.storage_client.bucket(self.bucket_name)
@@ -56,20 +152,11 @@ class BatchProcessor:
                 logger.info(f"バッチ処理用バケット作成: {self.bucket_name}")
             else:
                 logger.info(f"バッチ処理用バケット確認: {self.bucket_name}")
+            return bucket
         except Exception as e:
             logger.error(f"バケット作成エラー: {e}")
             raise
     
-    def upload_image_to_storage(self, image_path: Path) -> str:
-        """画像をCloud Storageにアップロード"""
-        blob_name = f"images/{uuid.uuid4()}-{image_path.name}"
-        bucket = self.storage_client.bucket(self.bucket_name)
-        blob = bucket.blob(blob_name)
-        
-        blob.upload_from_filename(str(image_path))
-        
-        return f"gs://{self.bucket_name}/{blob_name}"
-    
     def prepare_batch_requests(self, image_files: List[Path]) -> List[str]:
         """バッチ処理用のリクエストデータを準備（画像ファイル名昇順）"""
         batch_requests = []
@@ -78,13 +165,43 @@ class BatchProcessor:
         sorted_image_files = sorted(image_files, key=lambda x: x.name.lower())
         logger.info(f"バッチリクエストを画像ファイル名昇順で準備開始")
         
-        for image_path in sorted_image_files:
+        # 画像アップロードはネットワーク待ちが支配的なので並列実行（mapで入力順を維持）
+        with ThreadPoolExecutor(max_workers=config.BATCH_UPLOAD_WORKERS) as executor:
+            # 内容ハッシュで同一画像をまとめ、アップロードは1回だけにする
+            digests = list(executor.map(self._hash_image_safe, sorted_image_files))
+            unique_images = {}
+            for image_path, digest in zip(sorted_image_files, digests):
+                if digest is not None:
+                    unique_images.setdefault(digest, image_path)
+            
+            if len(unique_images) < len(sorted_image_files):
+                logger.info(f"重複画像を除外してアップロード: {len(unique_images)}/{len(sorted_image_files)}個")
+            
+            uploaded = list(executor.map(self._upload_image_safe, unique_images.values(), unique_images.keys()))
+        
+        self._save_upload_cache()
+        
+        uri_by_digest = dict(zip(unique_images.keys(), uploaded))
+        image_uris = [uri_by_digest.get(digest) for digest in digests]
+        
+        # ループ内で参照する値はローカル変数に束縛
+        prompt = config.PROMPT_TEMPLATE
+        splitext = os.path.splitext
+        
+        # 同じ内容の画像はリクエストも1件にする（結果は内容キーで他の画像と共有される）
+        requested_uris = set()
+        
+        for image_path, image_uri in zip(sorted_image_files, image_uris):
+            if image_uri is None:
+                continue
+            if image_uri in requested_uris:
+                logger.debug(f"同一内容の画像のためリクエストを省略: {image_path.name}")
+                continue
+            requested_uris.add(image_uri)
+            
             try:
-                # 画像をCloud Storageにアップロード
-                image_uri = self.upload_image_to_storage(image_path)
-                
-                # MIMEタイプ判定
-                mime_type = self._get_mime_type(image_path)
+                # MIMEタイプ判定（縮小版はJPEGになるため、アップロード先の拡張子で判定）
+                mime_type = get_mime_type(splitext(image_uri)[1])
                 
                 # バッチリクエスト形式（画像ファイル名を識別子として追加）
                 request = {
@@ -93,7 +210,7 @@ class BatchProcessor:
                             {
                                 "role": "user",
                                 "parts": [
-                                    {"text": config.PROMPT_TEMPLATE},
+                                    {"text": prompt},
                                     {
                                         "fileData": {
                                             "fileUri": image_uri,
@@ -107,7 +224,7 @@ class BatchProcessor:
                     "customId": str(image_path.name)  # 画像ファイル名を識別子として追加
                 }
                 
-                batch_requests.append(json.dumps(request))
+                batch_requests.append(_dumps(request))
                 logger.debug(f"バッチリクエスト準備完了: {image_path.name}")
                 
             except Exception as e:
@@ -116,50 +233,109 @@ class BatchProcessor:
         
         return batch_requests
     
+    def upload_unique_image_to_storage(self, image_path: Path, digest: str) -> str:
+        """画像を内容ハッシュ名でアップロード（同じ内容が既にあれば再アップロードしない）
+        
+        大きな画像はリアルタイム処理と同じ基準でJPEGに縮小してからアップロードする。
+        縮小版のblob名には最大辺を含めるため、MAX_IMAGE_SIZEを変更すると別オブジェクトになる。
+        """
+        original_name = f"images/{digest}{image_path.suffix.lower()}"
+        shrunk_name = f"images/{digest}-{config.MAX_IMAGE_SIZE}.jpg"
+        
+        # 記録済みならバケットへの問い合わせや画像の読み込み自体を省略
+        for blob_name in (shrunk_name, original_name):
+            if blob_name in self._uploaded:
+                logger.debug(f"アップロード済み画像を再利用: {image_path.name}")
+                return self._gs_prefix + blob_name
+        
+        with self._shrink_slots:
+            image_data = image_path.read_bytes()
+            shrunk_data, _ = shrink_image(image_data, self._get_mime_type(image_path), config.MAX_IMAGE_SIZE)
+        blob_name = original_name if shrunk_data is image_data else shrunk_name
+        blob = self.bucket.blob(blob_name)
+        if blob.exists():
+            logger.debug(f"アップロード済み画像を再利用: {image_path.name}")
+        elif blob_name == original_name:
+            blob.upload_from_filename(str(image_path))
+        else:
+            blob.upload_from_string(shrunk_data, content_type='image/jpeg')
+        
+        with self._uploaded_lock:
+            self._uploaded[blob_name] = time.time()
+        return self._gs_prefix + blob_name
+    
+    def _load_upload_cache(self) -> Dict[str, float]:
+        """アップロード済み画像の記録を読み込み（期限切れの記録は除外）"""
+        try:
+            entries = _loads(self._upload_cache_path.read_bytes())
+        except (OSError, ValueError) as e:
+            if self._upload_cache_path.exists():
+                logger.warning(f"アップロード記録の読み込みエラー: {e}")
+            return {}
+        
+        if not isinstance(entries, dict):
+            return {}
+        
+        expires_before = time.time() - config.UPLOAD_CACHE_TTL_DAYS * 86400
+        return {name: uploaded_at for name, uploaded_at in entries.items()
+                if isinstance(uploaded_at, (int, float)) and uploaded_at >= expires_before}
+    
+    def _save_upload_cache(self) -> None:
+        """アップロード済み画像の記録を保存（複数チャンクから同時に呼ばれるため、ロック下で一時ファイル経由で置き換える）"""
+        temp_path = self._upload_cache_path.with_name(f"{self._upload_cache_path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        with self._uploaded_lock:
+            try:
+                self._upload_cache_path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path.write_text(_dumps(self._uploaded), encoding='utf-8')
+                os.replace(temp_path, self._upload_cache_path)
+            except OSError as e:
+                logger.warning(f"アップロード記録の保存エラー: {e}")
+                temp_path.unlink(missing_ok=True)
+    
+    def _hash_image_safe(self, image_path: Path) -> Optional[str]:
+        """画像の内容ハッシュを計算（失敗時はNoneを返す）"""
+        try:
+            return _hash_file(image_path)
+        except Exception as e:
+            logger.error(f"バッチリクエスト準備エラー {image_path}: {e}")
+            return None
+    
+    def _upload_image_safe(self, image_path: Path, digest: str) -> Optional[str]:
+        """画像をアップロード（失敗時はNoneを返す）"""
+        try:
+            return self.upload_unique_image_to_storage(image_path, digest)
+        except Exception as e:
+            logger.error(f"バッチリクエスト準備エラー {image_path}: {e}")
+            return None
+    
     def _get_mime_type(self, image_path: Path) -> str:
         """ファイル拡張子からMIMEタイプを判定"""
-        suffix = image_path.suffix.lower()
-        mime_map = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif'
-        }
-        return mime_map.get(suffix, 'image/jpeg')
+        return get_mime_type(image_path.suffix)
     
     def upload_batch_input(self, batch_requests: List[str]) -> str:
         """バッチ入力をCloud Storageにアップロード"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # 複数ジョブを同時に作成しても衝突しないよう、時刻に乱数を付加
+        timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
         input_filename = f"batch_input_{timestamp}.jsonl"
         
-        # 一時ファイルに書き込み
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.jsonl') as f:
-            for request in batch_requests:
-                f.write(request + '\n')
-            temp_path = f.name
+        # 一時ファイルを経由せずメモリから直接アップロード
+        payload = "".join(request + '\n' for request in batch_requests)
         
-        try:
-            # Cloud Storageにアップロード
-            blob_name = f"batch_inputs/{input_filename}"
-            bucket = self.storage_client.bucket(self.bucket_name)
-            blob = bucket.blob(blob_name)
-            
-            blob.upload_from_filename(temp_path)
-            
-            input_uri = f"gs://{self.bucket_name}/{blob_name}"
-            logger.info(f"バッチ入力アップロード完了: {input_uri}")
-            
-            return input_uri
-            
-        finally:
-            # 一時ファイル削除
-            os.unlink(temp_path)
+        blob_name = f"batch_inputs/{input_filename}"
+        blob = self.bucket.blob(blob_name)
+        
+        blob.upload_from_string(payload, content_type="application/x-ndjson")
+        
+        input_uri = self._gs_prefix + blob_name
+        logger.info(f"バッチ入力アップロード完了: {input_uri}")
+        
+        return input_uri
     
     def create_batch_job(self, input_uri: str, model_name: str) -> str:
         """バッチ予測ジョブを作成"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
         job_name = f"anki-batch-job-{timestamp}"
-        output_uri = f"gs://{self.bucket_name}/batch_outputs/{timestamp}/"
+        output_uri = f"{self._gs_prefix}batch_outputs/{timestamp}/"
         
         try:
             # 同期的作成か非同期的作成かを設定で決定
@@ -210,12 +386,29 @@ class BatchProcessor:
             logger.error(f"バッチジョブ作成エラー: {e}")
             raise e
     
+    def get_job_state(self, job_id: str) -> str:
+        """Job Service APIからバッチジョブの状態名を直接取得"""
+        if self._job_client is None:
+            self._job_client = aiplatform.gapic.JobServiceClient(
+                client_options={"api_endpoint": f"{self.location}-aiplatform.googleapis.com"}
+            )
+        
+        # ジョブIDのみの場合はリソース名に変換
+        if '/' in job_id:
+            name = job_id
+        else:
+            name = f"projects/{self.project_id}/locations/{self.location}/batchPredictionJobs/{job_id}"
+        
+        job = self._job_client.get_batch_prediction_job(name=name)
+        return job.state.name
+    
     def wait_for_completion(self, job_id: str, timeout: int = 1800) -> List[Dict[str, Any]]:
         """バッチジョブの完了を待機"""
         logger.info("バッチジョブの完了を待機中...")
         
         job = aiplatform.BatchPredictionJob(job_id)
         start_time = time.time()
+        interval = POLL_INITIAL_INTERVAL
         
         while True:
             # refresh() メソッドの存在を確認してから使用
@@ -248,7 +441,10 @@ class BatchProcessor:
             elif time.time() - start_time > timeout:
                 raise Exception("バッチジョブタイムアウト")
             
-            time.sleep(30)  # 30秒間隔でチェック
+            # 指数バックオフで間隔を延ばしつつチェック（タイムアウトは超えない）
+            remaining = timeout - (time.time() - start_time)
+            time.sleep(max(0.0, min(interval, remaining)))
+            interval = min(interval * POLL_BACKOFF_FACTOR, POLL_MAX_INTERVAL)
         
         # 結果を取得
         return self.download_batch_results(job)
@@ -265,25 +461,51 @@ class BatchProcessor:
         gs_path = output_location.replace("gs://", "")
         bucket_name, prefix = gs_path.split("/", 1)
         
-        bucket = self.storage_client.bucket(bucket_name)
+        # 自前のバケットならキャッシュ済みのオブジェクトを再利用
+        if bucket_name == self.bucket_name:
+            bucket = self.bucket
+        else:
+            bucket = self.storage_client.bucket(bucket_name)
         
-        # 結果ファイルをダウンロード
-        for blob in bucket.list_blobs(prefix=prefix):
-            if blob.name.endswith('.jsonl'):
-                content = blob.download_as_text()
-                for line in content.strip().split('\n'):
-                    if line.strip():
-                        results.append(json.loads(line))
+        # 結果ファイルを並列ダウンロード（mapで一覧順を維持）
+        blobs = [blob for blob in bucket.list_blobs(prefix=prefix) if blob.name.endswith('.jsonl')]
+        with ThreadPoolExecutor(max_workers=config.BATCH_DOWNLOAD_WORKERS) as executor:
+            for blob_results in executor.map(read_jsonl_blob, blobs):
+                results.extend(blob_results)
         
         logger.info(f"バッチ結果取得完了: {len(results)}件")
         return results
 
 
 class BatchJobManager:
-    """バッチジョブ管理クラス"""
+    """バッチジョブ管理クラス（JSON Lines形式で1行1ジョブを保存）"""
     
-    def __init__(self, job_file: str = "batch_jobs.json"):
+    def __init__(self, job_file: str = "batch_jobs.jsonl"):
         self.job_file = Path(job_file)
+        # (更新時刻, ジョブ一覧) のキャッシュ：ファイルが変わっていなければ再解析しない
+        self._cache: Optional[Tuple[int, List[Dict[str, Any]]]] = None
+        self._migrate_legacy_job_file()
+    
+    def _migrate_legacy_job_file(self) -> None:
+        """旧形式（JSON配列のbatch_jobs.json）のジョブ情報があれば一度だけ追記して移行"""
+        legacy_file = self.job_file.with_suffix('.json')
+        if legacy_file == self.job_file or not legacy_file.exists():
+            return
+        
+        try:
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                legacy_jobs = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"旧形式のジョブ情報を読み込めません（移行をスキップ）: {legacy_file} - {e}")
+            return
+        
+        with open(self.job_file, 'a', encoding='utf-8') as f:
+            for job_info in legacy_jobs:
+                f.write(_dumps(job_info) + '\n')
+        
+        # 二重に移行しないよう旧ファイルは退避
+        legacy_file.replace(legacy_file.with_name(legacy_file.name + '.migrated'))
+        logger.info(f"旧形式のジョブ情報を移行しました: {len(legacy_jobs)}件 ({legacy_file} → {self.job_file})")
     
     def save_job_info(self, job_id: str, image_files: List[Path]) -> None:
         """バッチジョブ情報を保存"""
@@ -294,26 +516,45 @@ class BatchJobManager:
             "status": "RUNNING"
         }
         
-        # 既存のジョブ情報を読み込み
-        jobs = self._load_jobs()
-        jobs.append(job_info)
-        
-        # ファイルに保存
-        with open(self.job_file, 'w', encoding='utf-8') as f:
-            json.dump(jobs, f, ensure_ascii=False, indent=2)
+        # 追記のみ（既存ジョブの読み込み・書き直しは不要）
+        with open(self.job_file, 'a', encoding='utf-8') as f:
+            f.write(_dumps(job_info) + '\n')
+        self._cache = None
         
         logger.info(f"ジョブ情報を保存しました: {self.job_file}")
     
     def _load_jobs(self) -> List[Dict[str, Any]]:
         """ジョブ情報を読み込み"""
-        if not self.job_file.exists():
+        try:
+            mtime = self.job_file.stat().st_mtime_ns
+        except FileNotFoundError:
             return []
         
+        if self._cache is not None and self._cache[0] == mtime:
+            return list(self._cache[1])
+        
+        jobs = []
         try:
             with open(self.job_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        job_info = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"ジョブ情報の解析エラー: {e}")
+                        continue
+                    # job_idのない記録は処理できないため読み飛ばす
+                    if not isinstance(job_info, dict) or not job_info.get("job_id"):
+                        logger.warning(f"ジョブIDのないジョブ情報を無視: {line.strip()[:100]}")
+                        continue
+                    jobs.append(job_info)
+        except OSError as e:
+            logger.warning(f"ジョブ情報の読み込みエラー: {e}")
+            return jobs
+        
+        self._cache = (mtime, jobs)
+        return list(jobs)
     
     def get_pending_jobs(self) -> List[Dict[str, Any]]:
         """未完了のジョブ一覧を取得"""
@@ -322,4 +563,6 @@ class BatchJobManager:
     def update_jobs(self, remaining_jobs: List[Dict[str, Any]]) -> None:
         """ジョブ情報を更新"""
         with open(self.job_file, 'w', encoding='utf-8') as f:
-            json.dump(remaining_jobs, f, ensure_ascii=False, indent=2)
+            for job_info in remaining_jobs:
+                f.write(_dumps(job_info) + '\n')
+        self._cache = None
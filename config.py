@@ -4,11 +4,12 @@ Anki画像解説カード生成ツール - 設定管理
 """
 
 import os
+from functools import lru_cache
 from pathlib import Path
-from dotenv import load_dotenv
+from env_loader import load_env
 
 # .envファイルを読み込み
-load_dotenv()
+load_env()
 
 # Google Cloud Platform設定
 PROJECT_ID = os.getenv('GCP_PROJECT_ID', 'your-gcp-project-id')
@@ -23,20 +24,30 @@ MODEL_ID = int(os.getenv('ANKI_MODEL_ID', '1607392319'))
 DECK_ID = int(os.getenv('ANKI_DECK_ID', '2059400110'))
 
 # ディレクトリ設定
-IMAGE_FOLDER = os.getenv('IMAGE_FOLDER', './img')
-OUTPUT_FOLDER = os.getenv('OUTPUT_FOLDER', './output')
-CREDENTIALS_FOLDER = os.getenv('CREDENTIALS_FOLDER', './credentials')
+IMAGE_FOLDER = Path(os.getenv('IMAGE_FOLDER', './img'))
+OUTPUT_FOLDER = Path(os.getenv('OUTPUT_FOLDER', './output'))
+CREDENTIALS_FOLDER = Path(os.getenv('CREDENTIALS_FOLDER', './credentials'))
 # 処理設定
-API_WAIT_TIME = int(os.getenv('API_WAIT_TIME', '1'))
 MAX_RETRY_COUNT = int(os.getenv('MAX_RETRY_COUNT', '3'))
+MAX_CONCURRENCY = int(os.getenv('MAX_CONCURRENCY', '5'))  # Gemini APIへの同時リクエスト数
+GEMINI_RPM = int(os.getenv('GEMINI_RPM', '60'))  # Gemini APIへの1分あたりの最大リクエスト数（0で無制限）
+MULTI_IMAGE_CHUNK_SIZE = int(os.getenv('MULTI_IMAGE_CHUNK_SIZE', '0'))  # リアルタイム処理で1リクエストにまとめる画像数（0または1で無効）
+PROMPT_CACHE_ENABLED = os.getenv('PROMPT_CACHE_ENABLED', 'false').lower() == 'true'  # プロンプトをコンテキストキャッシュに登録するか
+PROMPT_CACHE_TTL_MINUTES = int(os.getenv('PROMPT_CACHE_TTL_MINUTES', '60'))  # コンテキストキャッシュの保持時間（分）
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'  # 解説文をキャッシュして再実行時に再利用するか
+RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', './.cache/gemini_results.sqlite3')
 MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', '2048'))  # ピクセル
-SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp']
 
 # バッチ処理設定
 BATCH_THRESHOLD = int(os.getenv('BATCH_THRESHOLD', '10'))  # バッチ処理を使用する最小画像数
 USE_BATCH_PROCESSING = os.getenv('USE_BATCH_PROCESSING', 'true').lower() == 'true'  # バッチ処理を使用するかどうか
 BATCH_WAIT_FOR_COMPLETION = os.getenv('BATCH_WAIT_FOR_COMPLETION', 'false').lower() == 'true'  # バッチ完了まで待機するか
 BATCH_JOB_SYNC_CREATE = os.getenv('BATCH_JOB_SYNC_CREATE', 'false').lower() == 'true'  # バッチジョブ作成を同期的に行うか
+BATCH_UPLOAD_WORKERS = int(os.getenv('BATCH_UPLOAD_WORKERS', '16'))  # 画像アップロードの並列数
+BATCH_DOWNLOAD_WORKERS = int(os.getenv('BATCH_DOWNLOAD_WORKERS', '8'))  # 結果ファイルダウンロードの並列数
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '500'))  # 1つのバッチジョブに含める最大画像数（超える場合は分割）
+UPLOAD_CACHE_PATH = os.getenv('UPLOAD_CACHE_PATH', './.cache/uploaded_images.json')  # アップロード済み画像の記録
+UPLOAD_CACHE_TTL_DAYS = int(os.getenv('UPLOAD_CACHE_TTL_DAYS', '7'))  # 記録を信用する日数（経過後はバケットを再確認）
 
 # Google認証情報の設定
 google_credentials = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
@@ -47,8 +58,9 @@ if google_credentials:
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 LOG_FILE = os.getenv('LOG_FILE', 'anki_generator.log')
 
+@lru_cache(maxsize=1)
 def validate_config():
-    """設定の検証"""
+    """設定の検証（結果はキャッシュされ、2回目以降は再検証しない）"""
     errors = []
     
     if PROJECT_ID == 'your-gcp-project-id':
@@ -58,11 +70,10 @@ def validate_config():
         errors.append(f"認証情報ファイルが見つかりません: {google_credentials}")
     
     # 必要なディレクトリの確認
-    for folder in [IMAGE_FOLDER, OUTPUT_FOLDER, CREDENTIALS_FOLDER]:
-        if not Path(folder).exists():
-            Path(folder).mkdir(parents=True, exist_ok=True)
+    for folder in (IMAGE_FOLDER, OUTPUT_FOLDER, CREDENTIALS_FOLDER):
+        folder.mkdir(parents=True, exist_ok=True)
     
-    return errors
+    return tuple(errors)
 
 # プロンプト設定
 PROMPT_TEMPLATE = """
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+.envファイル読み込みモジュール
+標準ライブラリのみで.envファイルを解析し、環境変数へ反映（python-dotenvの代替）
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+
+def _parse_value(value: str) -> str:
+    """値の引用符とインラインコメントを取り除く"""
+    # 引用符で始まる値は対応する閉じ引用符までを値とし、それ以降（コメント等）は無視
+    if value[:1] in ('"', "'"):
+        end = value.find(value[0], 1)
+        if end > 0:
+            return value[1:end]
+    
+    # 引用符なしの値では「 #」以降をコメントとして扱う
+    comment = value.find(' #')
+    if comment >= 0:
+        value = value[:comment]
+    return value.rstrip()
+
+
+# 実行時のカレントディレクトリに関わらず、スクリプトと同じフォルダの.envを読み込む
+DEFAULT_ENV_PATH = Path(__file__).with_name('.env')
+
+# load_envが.envから設定した環境変数名（再読み込み時に上書きしてよいもの）
+_loaded_keys = set()
+
+
+def load_env(path: Optional[str] = None) -> bool:
+    """.envファイルを読み込み、未設定の環境変数のみ設定（ファイルがなければFalse）"""
+    env_path = Path(path) if path is not None else DEFAULT_ENV_PATH
+    if not env_path.is_file():
+        return False
+    
+    with open(env_path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] == '#':
+                continue
+            if line.startswith('export '):
+                line = line[7:].lstrip()
+            
+            key, sep, value = line.partition('=')
+            key = key.strip()
+            if not sep or not key:
+                continue
+            
+            # 既存の環境変数を優先（load_dotenvのデフォルト動作と同じ）
+            if key not in os.environ:
+                os.environ[key] = _parse_value(value.strip())
+                _loaded_keys.add(key)
+    
+    return True
+
+
+def reload_env(path: Optional[str] = None) -> bool:
+    """.envファイルを再読み込み（以前.envから設定した値のみ更新し、シェル等で設定された値は維持）"""
+    for key in _loaded_keys:
+        os.environ.pop(key, None)
+    _loaded_keys.clear()
+    return load_env(path)
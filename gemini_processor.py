@@ -4,109 +4,555 @@ Gemini処理モジュール
 Vertex AI Geminiを使用した画像解説生成
 """
 
-import base64
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import queue
+import random
+import re
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import logging
 
-# Vertex AI インポート
+# Vertex AI（読み込みに時間がかかるため、is_available()またはGeminiProcessorの初期化時に読み込む）
+vertexai = None
+GenerationConfig = None
+GenerativeModel = None
+Part = None
+caching = None
+VERTEX_AI_VERSION: Optional[str] = None
+PROMPT_CACHE_AVAILABLE = False
+
+# Google API 例外クラス（エラー種別の判定に使用）
 try:
-    import vertexai
-    try:
-        from vertexai.preview.generative_models import GenerativeModel, Part
-        VERTEX_AI_AVAILABLE = True
-        VERTEX_AI_VERSION = "preview"
-    except ImportError:
-        try:
-            from vertexai.generative_models import GenerativeModel, Part
-            VERTEX_AI_AVAILABLE = True
-            VERTEX_AI_VERSION = "new"
-        except ImportError:
-            VERTEX_AI_AVAILABLE = False
-            VERTEX_AI_VERSION = None
+    from google.api_core import exceptions as google_exceptions
+    RETRYABLE_EXCEPTIONS = (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+    )
+    FATAL_EXCEPTIONS = (
+        google_exceptions.Unauthenticated,
+        google_exceptions.PermissionDenied,
+        google_exceptions.InvalidArgument,
+        google_exceptions.NotFound,
+    )
 except ImportError:
-    VERTEX_AI_AVAILABLE = False
-    VERTEX_AI_VERSION = None
+    RETRYABLE_EXCEPTIONS = ()
+    FATAL_EXCEPTIONS = ()
 
 import config
-from image_validator import ImageValidator
+from image_validator import ImageValidator, get_mime_type, shrink_image
+from result_cache import ResultCache
 
 logger = logging.getLogger(__name__)
 
 
+def _import_vertex_ai() -> None:
+    """Vertex AIのパッケージを読み込む（読み込み済みなら何もしない。利用できない場合はImportError）"""
+    global vertexai, GenerationConfig, GenerativeModel, Part, caching, VERTEX_AI_VERSION, PROMPT_CACHE_AVAILABLE
+    if VERTEX_AI_VERSION is not None:
+        return
+    
+    import vertexai
+    try:
+        from vertexai.preview.generative_models import GenerationConfig, GenerativeModel, Part
+        version = "preview"
+    except ImportError:
+        from vertexai.generative_models import GenerationConfig, GenerativeModel, Part
+        version = "new"
+    
+    # コンテキストキャッシュ（固定プロンプトをサーバー側に保持）
+    try:
+        from vertexai.preview import caching
+        PROMPT_CACHE_AVAILABLE = True
+    except ImportError:
+        PROMPT_CACHE_AVAILABLE = False
+    
+    # 読み込み済みの判定に使うため最後に代入
+    VERTEX_AI_VERSION = version
+
+# リトライ待機時間（秒）：base * 2^attempt にジッターを加え、上限で打ち切る
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+# 複数画像を1リクエストにまとめる場合に、プロンプトの後に付ける出力形式の指示
+_BULK_INSTRUCTION = (
+    "上記の{count}枚の画像それぞれについて、指示に従った解説を作成してください。"
+    "出力は画像番号ごとに1要素とした次の形式のJSON配列のみとしてください: "
+    '[{{"index": 画像番号, "description": "解説文"}}]'
+)
+
+_RETRYABLE_CODES = {429, 500, 503, 504}
+_FATAL_CODES = {400, 401, 403, 404}
+_RETRYABLE_MESSAGE = re.compile(r'rate limit|quota|429|resource exhausted|timeout|timed out|unavailable', re.IGNORECASE)
+_FATAL_MESSAGE = re.compile(r'invalid[ _]argument|permission[ _]denied|api key not valid|unauthenticated|unsupported mime', re.IGNORECASE)
+
+
+def _is_retryable_error(error: Exception) -> bool:
+    """リトライで回復しうるエラーか判定（認証・入力エラーは即時失敗）"""
+    if RETRYABLE_EXCEPTIONS and isinstance(error, RETRYABLE_EXCEPTIONS):
+        return True
+    if FATAL_EXCEPTIONS and isinstance(error, FATAL_EXCEPTIONS):
+        return False
+    
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        if code in _RETRYABLE_CODES:
+            return True
+        if code in _FATAL_CODES:
+            return False
+    
+    message = str(error)
+    if _RETRYABLE_MESSAGE.search(message):
+        return True
+    if _FATAL_MESSAGE.search(message):
+        return False
+    
+    # 種別不明のエラーは従来どおりリトライ対象とする
+    return True
+
+
+def _backoff_delay(attempt: int) -> float:
+    """指数バックオフ＋ジッターによる待機時間を計算"""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+    return delay + random.uniform(0, RETRY_BASE_DELAY)
+
+
+@lru_cache(maxsize=8)
+def _get_model(project_id: str, location: str, model_name: str) -> "GenerativeModel":
+    """Vertex AIを初期化してモデルを取得（同じ設定ではプロセス内で共有）"""
+    vertexai.init(project=project_id, location=location)
+    return GenerativeModel(model_name)
+
+
+@lru_cache(maxsize=8)
+def _get_prompt_cached_model(project_id: str, location: str, model_name: str, prompt: str) -> Optional["GenerativeModel"]:
+    """プロンプトをシステム指示としてコンテキストキャッシュに登録したモデルを取得（登録できない場合はNone）"""
+    vertexai.init(project=project_id, location=location)
+    try:
+        cached_content = caching.CachedContent.create(
+            model_name=model_name,
+            system_instruction=prompt,
+            ttl=datetime.timedelta(minutes=config.PROMPT_CACHE_TTL_MINUTES)
+        )
+    except Exception as e:
+        # プロンプトが最小トークン数に満たない場合などは通常のリクエストで送信する
+        logger.warning(f"プロンプトのコンテキストキャッシュを作成できません（通常のリクエストを使用）: {e}")
+        return None
+    
+    logger.info(f"プロンプトをコンテキストキャッシュに登録: {cached_content.name}")
+    return GenerativeModel.from_cached_content(cached_content=cached_content)
+
+
+class RateLimiter:
+    """スライディングウィンドウ方式のリクエスト数制限（asyncioとスレッドの両方から利用可能）"""
+    
+    def __init__(self, max_requests: int, period: float = 60.0):
+        """初期化（max_requestsが0以下の場合は制限しない）"""
+        self.max_requests = max_requests
+        self.period = period
+        self._timestamps: Deque[float] = deque()
+        self._lock = threading.Lock()
+    
+    def _reserve(self) -> float:
+        """枠が空いていれば1件分を記録して0を、空いていなければ空くまでの秒数を返す"""
+        with self._lock:
+            now = time.monotonic()
+            while self._timestamps and now - self._timestamps[0] >= self.period:
+                self._timestamps.popleft()
+            
+            if len(self._timestamps) < self.max_requests:
+                self._timestamps.append(now)
+                return 0.0
+            
+            # 最も古いリクエストがウィンドウから外れるまでの時間
+            return self.period - (now - self._timestamps[0])
+    
+    async def acquire(self) -> None:
+        """直近period秒のリクエスト数が上限未満になるまで待機し、1件分を記録"""
+        if self.max_requests <= 0:
+            return
+        
+        while True:
+            delay = self._reserve()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+    
+    def acquire_sync(self) -> None:
+        """acquireの同期版（スレッドから呼び出す）"""
+        if self.max_requests <= 0:
+            return
+        
+        while True:
+            delay = self._reserve()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+
 class GeminiProcessor:
     """Gemini処理クラス"""
     
     def __init__(self, project_id: str, location: str, model_name: str):
         """初期化"""
-        if not VERTEX_AI_AVAILABLE:
+        if not is_available():
             raise ImportError("Vertex AI パッケージが利用できません")
         
-        # Vertex AI初期化
-        vertexai.init(project=project_id, location=location)
-        self.model = GenerativeModel(model_name)
+        # Vertex AI初期化（モデルは設定ごとにキャッシュしてスレッド間で共有）
+        self.model = _get_model(project_id, location, model_name)
+        self.model_name = model_name
+        
+        # プロンプトをコンテキストキャッシュに置けた場合、リクエストには画像のみを送る
+        self._prompt_cached = False
+        if config.PROMPT_CACHE_ENABLED and PROMPT_CACHE_AVAILABLE:
+            cached_model = _get_prompt_cached_model(project_id, location, model_name, config.PROMPT_TEMPLATE)
+            if cached_model is not None:
+                self.model = cached_model
+                self._prompt_cached = True
         self.validator = ImageValidator()
         
+        # 解説文キャッシュ（同じ画像・プロンプト・モデルの再実行ではAPIを呼ばない）
+        self.result_cache: Optional[ResultCache] = None
+        if config.RESULT_CACHE_ENABLED:
+            try:
+                self.result_cache = ResultCache(config.RESULT_CACHE_PATH)
+            except Exception as e:
+                logger.warning(f"結果キャッシュを利用できません: {e}")
+        
         logger.info(f"Gemini初期化完了: {model_name} (バージョン: {VERTEX_AI_VERSION})")
     
     def generate_description(self, image_path: str, retry_count: Optional[int] = None) -> str:
         """Geminiを使用して画像の解説を生成"""
         if retry_count is None:
             retry_count = config.MAX_RETRY_COUNT
-            
+        
+        description, image_part, cache_key = self._prepare_request(image_path)
+        if description is not None:
+            return description
+        
+        return self._request_description(image_path, image_part, cache_key, retry_count)
+    
+    def _request_description(self, image_path: str, image_part: Part, cache_key: str, retry_count: int,
+                             rate_limiter: Optional[RateLimiter] = None) -> str:
+        """API呼び出しとリトライ（同期版、rate_limiter指定時は各試行の前に枠を確保）"""
         for attempt in range(retry_count):
+            if rate_limiter is not None:
+                rate_limiter.acquire_sync()
+            description, delay = self._attempt(image_path, image_part, cache_key, attempt, retry_count)
+            if description is not None:
+                return description
+            time.sleep(delay)  # リトライ前に待機
+        
+        return "解説の生成に失敗しました（最大試行回数超過）。"
+    
+    def generate_descriptions_bulk(self, image_paths: List[str], chunk_size: Optional[int] = None) -> List[str]:
+        """複数画像をchunk_size枚ずつ1リクエストにまとめて解説を生成（結果は入力順）
+        
+        キャッシュ済みの画像はAPIを呼ばない。まとめたリクエストで解説が得られなかった画像は
+        1枚ずつのリクエストで生成し直す。
+        """
+        if chunk_size is None:
+            chunk_size = config.MULTI_IMAGE_CHUNK_SIZE
+        chunk_size = max(1, chunk_size)
+        
+        results: List[Optional[str]] = [None] * len(image_paths)
+        requests = []
+        for index, image_path in enumerate(image_paths):
+            description, image_part, cache_key = self._prepare_request(image_path)
+            if description is not None:
+                results[index] = description
+            else:
+                requests.append((index, image_path, image_part, cache_key))
+        
+        chunks = [requests[i:i + chunk_size] for i in range(0, len(requests), chunk_size)]
+        # まとめたリクエストと1枚ずつの再生成の両方をGEMINI_RPMの制限対象にする
+        rate_limiter = RateLimiter(config.GEMINI_RPM)
+        
+        def process_chunk(chunk) -> None:
+            for (index, image_path, image_part, cache_key), description in zip(chunk, self._request_bulk(chunk, rate_limiter)):
+                if description is None:
+                    description = self._request_description(image_path, image_part, cache_key, config.MAX_RETRY_COUNT,
+                                                            rate_limiter)
+                else:
+                    self.store_description(cache_key, description)
+                results[index] = description
+        
+        # まとめたリクエスト同士はMAX_CONCURRENCYまで並列に送信
+        if chunks:
+            with ThreadPoolExecutor(max_workers=min(len(chunks), max(1, config.MAX_CONCURRENCY))) as executor:
+                list(executor.map(process_chunk, chunks))
+        
+        return results
+    
+    def _request_bulk(self, chunk: List[Tuple[int, str, Part, str]], rate_limiter: RateLimiter) -> List[Optional[str]]:
+        """複数画像を1リクエストで送信し、画像ごとの解説を返す（取得できなかった画像はNone）"""
+        contents = [] if self._prompt_cached else [config.PROMPT_TEMPLATE]
+        for number, (_, image_path, image_part, _) in enumerate(chunk, 1):
+            contents.append(f"画像{number}: {Path(image_path).name}")
+            contents.append(image_part)
+        contents.append(_BULK_INSTRUCTION.format(count=len(chunk)))
+        
+        descriptions: List[Optional[str]] = [None] * len(chunk)
+        try:
+            rate_limiter.acquire_sync()
+            logger.info(f"Gemini解説生成開始（{len(chunk)}枚をまとめて送信）")
+            response = self.model.generate_content(
+                contents,
+                generation_config=GenerationConfig(response_mime_type="application/json")
+            )
+            items = json.loads(response.text)
+        except Exception as e:
+            logger.warning(f"まとめたリクエストが失敗したため1枚ずつ生成します: {e}")
+            return descriptions
+        
+        if not isinstance(items, list):
+            logger.warning("まとめたリクエストの応答形式が不正なため1枚ずつ生成します")
+            return descriptions
+        
+        for item in items:
             try:
-                logger.info(f"Gemini解説生成開始 (試行 {attempt + 1}/{retry_count}): {Path(image_path).name}")
-                
-                # 画像の検証とエンコード
-                image_part = self._prepare_image_part(image_path)
-                if not image_part:
-                    return "画像の読み込みに失敗しました。"
-                
-                # Geminiに画像と共にプロンプトを送信
+                number = int(item["index"])
+                description = str(item["description"]).strip()
+            except (KeyError, TypeError, ValueError):
+                continue
+            if 1 <= number <= len(chunk) and description:
+                descriptions[number - 1] = description
+        
+        logger.info(f"Gemini解説生成完了（{sum(d is not None for d in descriptions)}/{len(chunk)}枚）")
+        return descriptions
+    
+    def iter_descriptions(self, image_paths: Iterable[Union[str, Path]], max_concurrency: Optional[int] = None) -> Iterator[str]:
+        """複数画像の解説を並列生成し、入力順に確定したものから順次返す
+        
+        解説生成はバックグラウンドスレッドで進むため、呼び出し側は受け取った解説の処理
+        （カード作成など）を生成と並行して行える。
+        """
+        if max_concurrency is None:
+            max_concurrency = config.MAX_CONCURRENCY
+        
+        completed: queue.Queue = queue.Queue()
+        done = object()
+        errors: List[BaseException] = []
+        
+        def run() -> None:
+            try:
+                asyncio.run(self._generate_descriptions_async(
+                    iter(image_paths), max(1, max_concurrency),
+                    on_result=lambda index, description: completed.put((index, description))
+                ))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                completed.put(done)
+        
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        
+        # 完了順に届く結果を並べ替え、先頭から連続して揃った分だけ返す
+        pending: Dict[int, str] = {}
+        next_index = 0
+        while True:
+            item = completed.get()
+            if item is done:
+                break
+            index, description = item
+            pending[index] = description
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+        
+        thread.join()
+        if errors:
+            raise errors[0]
+    
+    async def _generate_descriptions_async(self, image_paths: Iterator[Union[str, Path]], max_concurrency: int,
+                                           on_result: Optional[Callable[[int, str], None]] = None) -> List[str]:
+        """ワーカーが入力を順次取り出し、API呼び出しの同時実行数を制限して解説生成を並列実行"""
+        loop = asyncio.get_running_loop()
+        source = enumerate(image_paths)
+        source_lock = asyncio.Lock()
+        api_slots = asyncio.Semaphore(max_concurrency)
+        rate_limiter = RateLimiter(config.GEMINI_RPM)
+        # 内容キー → 解説生成タスク（同じ内容の画像はAPIを1回だけ呼んで結果を共有）
+        inflight: Dict[str, asyncio.Future] = {}
+        results: Dict[int, str] = {}
+        
+        # リトライ待機中のワーカーがいても他のワーカーがAPI枠を使えるよう、ワーカー数は同時実行数より多くする
+        worker_count = max_concurrency * 2
+        
+        with ThreadPoolExecutor(max_workers=worker_count) as executor:
+            async def worker() -> None:
+                while True:
+                    # 入力の取り出し（ジェネレータ内のI/O）もスレッドで行い、イベントループを止めない
+                    async with source_lock:
+                        item = await loop.run_in_executor(executor, next, source, None)
+                    if item is None:
+                        return
+                    
+                    index, image_path = item
+                    results[index] = await self._generate_description_async(
+                        str(image_path), loop, executor, api_slots, rate_limiter, inflight
+                    )
+                    if on_result is not None:
+                        on_result(index, results[index])
+            
+            await asyncio.gather(*(worker() for _ in range(worker_count)))
+        
+        return [results[index] for index in range(len(results))]
+    
+    async def _generate_description_async(self, image_path: str, loop: asyncio.AbstractEventLoop,
+                                          executor: ThreadPoolExecutor, api_slots: asyncio.Semaphore,
+                                          rate_limiter: RateLimiter, inflight: Dict[str, asyncio.Future]) -> str:
+        """1画像分の解説生成（同じ内容の画像が処理中・処理済みならその結果を共有）"""
+        description, image_part, cache_key = await loop.run_in_executor(executor, self._prepare_request, image_path)
+        if description is not None:
+            return description
+        
+        task = inflight.get(cache_key)
+        if task is None:
+            task = inflight[cache_key] = asyncio.ensure_future(
+                self._request_description_async(image_path, image_part, cache_key, loop, executor, api_slots, rate_limiter)
+            )
+        else:
+            logger.info(f"同一内容の画像の結果を共有: {Path(image_path).name}")
+        
+        return await task
+    
+    async def _request_description_async(self, image_path: str, image_part: Part, cache_key: str,
+                                         loop: asyncio.AbstractEventLoop, executor: ThreadPoolExecutor,
+                                         api_slots: asyncio.Semaphore, rate_limiter: RateLimiter) -> str:
+        """API呼び出しとリトライ（リトライ待機はスレッドやAPI枠を占有しない）"""
+        retry_count = config.MAX_RETRY_COUNT
+        
+        for attempt in range(retry_count):
+            # クォータの空き待ちはAPI枠を確保する前に行う
+            await rate_limiter.acquire()
+            async with api_slots:
+                description, delay = await loop.run_in_executor(
+                    executor, self._attempt, image_path, image_part, cache_key, attempt, retry_count
+                )
+            if description is not None:
+                return description
+            await asyncio.sleep(delay)  # リトライ前に待機
+        
+        return "解説の生成に失敗しました（最大試行回数超過）。"
+    
+    def description_key(self, image_path: str) -> Optional[str]:
+        """画像ファイルの内容キー（画像・プロンプト・モデル名のハッシュ）を計算（読み込めない場合はNone）"""
+        try:
+            # ファイル全体をbytesとして読み込まず、mmap経由でハッシュ計算
+            return ResultCache.make_file_key(image_path, config.PROMPT_TEMPLATE, self.model_name)
+        except OSError as e:
+            logger.error(f"画像読み込みエラー: {image_path} - {e}")
+            return None
+    
+    def get_cached_description(self, key: str) -> Optional[str]:
+        """キャッシュ済みの解説文を取得（キャッシュ無効時や未登録の場合はNone）"""
+        if self.result_cache is None:
+            return None
+        return self.result_cache.get(key)
+    
+    def store_description(self, key: str, description: str) -> None:
+        """解説文をキャッシュに保存（キャッシュ無効時は何もしない）"""
+        if self.result_cache is not None:
+            self.result_cache.set(key, description)
+    
+    def _prepare_request(self, image_path: str) -> Tuple[Optional[str], Optional[Part], Optional[str]]:
+        """リクエストの準備（(確定した解説文, 画像Part, キャッシュキー) を返す）
+        
+        画像の読み込み失敗やキャッシュヒットの場合は解説文が確定し、APIは呼ばない。
+        """
+        # 画像の検証と読み込み（リトライ間で再利用）
+        image_data = self._load_image(image_path)
+        if image_data is None:
+            return "画像の読み込みに失敗しました。", None, None
+        
+        # 内容キーは同一画像の重複判定にも使うため、キャッシュ無効時も計算する
+        cache_key = ResultCache.make_key(image_data, config.PROMPT_TEMPLATE, self.model_name)
+        cached = self.get_cached_description(cache_key)
+        if cached is not None:
+            logger.info(f"キャッシュ済みの解説を使用: {Path(image_path).name}")
+            return cached, None, None
+        
+        image_part = self._prepare_image_part(image_path, image_data)
+        if not image_part:
+            return "画像の読み込みに失敗しました。", None, None
+        
+        return None, image_part, cache_key
+    
+    def _attempt(self, image_path: str, image_part: Part, cache_key: str,
+                 attempt: int, retry_count: int) -> Tuple[Optional[str], float]:
+        """API呼び出し1回分（(確定した解説文, 次の試行までの待機秒数) を返す。リトライする場合は解説文がNone）"""
+        image_name = Path(image_path).name
+        is_last_attempt = attempt >= retry_count - 1
+        
+        try:
+            logger.debug(f"Gemini解説生成開始 (試行 {attempt + 1}/{retry_count}): {image_name}")
+            
+            # Geminiに画像と共にプロンプトを送信（キャッシュ済みの場合は画像のみ）
+            if self._prompt_cached:
+                response = self.model.generate_content([image_part])
+            else:
                 response = self.model.generate_content([
                     config.PROMPT_TEMPLATE,
                     image_part
                 ])
-                
-                if response.text:
-                    logger.info(f"Gemini解説生成完了: {Path(image_path).name}")
-                    return response.text.strip()
-                else:
-                    logger.warning(f"Geminiから空の応答: {Path(image_path).name}")
-                    if attempt < retry_count - 1:
-                        time.sleep(2)  # リトライ前に待機
-                        continue
-                    return "解説の生成に失敗しました（応答なし）。"
-                
-            except Exception as e:
-                logger.error(f"Gemini API エラー (試行 {attempt + 1}): {e}")
-                if attempt < retry_count - 1:
-                    time.sleep(5)  # リトライ前に待機
-                    continue
-                return f"解説の生成に失敗しました。エラー: {str(e)}"
-        
-        return "解説の生成に失敗しました（最大試行回数超過）。"
+            
+            if response.text:
+                logger.info(f"Gemini解説生成完了: {image_name}")
+                description = response.text.strip()
+                self.store_description(cache_key, description)
+                return description, 0.0
+            
+            logger.warning(f"Geminiから空の応答: {image_name}")
+            if is_last_attempt:
+                return "解説の生成に失敗しました（応答なし）。", 0.0
+            return None, _backoff_delay(attempt)
+            
+        except Exception as e:
+            logger.error(f"Gemini API エラー (試行 {attempt + 1}): {e}")
+            if not _is_retryable_error(e):
+                logger.error(f"リトライ不可能なエラーのため中断: {image_name}")
+                return f"解説の生成に失敗しました。エラー: {str(e)}", 0.0
+            if is_last_attempt:
+                return f"解説の生成に失敗しました。エラー: {str(e)}", 0.0
+            return None, _backoff_delay(attempt)
     
-    def _prepare_image_part(self, image_path: str) -> Optional[Part]:
+    def _load_image(self, image_path: str) -> Optional[bytes]:
+        """画像を検証して読み込み"""
+        if not self.validator.validate_image(image_path):
+            return None
+        return self._read_image_bytes(image_path)
+    
+    def _prepare_image_part(self, image_path: str, image_data: Optional[bytes] = None) -> Optional[Part]:
         """画像をGemini用のPartオブジェクトとして準備"""
         try:
-            # 画像検証
-            if not self.validator.validate_image(image_path):
-                return None
-            
-            # 画像をBase64エンコード
-            image_base64 = self._encode_image_to_base64(image_path)
-            if not image_base64:
-                return None
+            # 画像データを読み込み（Part.from_dataには生のバイト列をそのまま渡す）
+            if image_data is None:
+                image_data = self._load_image(image_path)
+                if image_data is None:
+                    return None
             
             # MIMEタイプ判定
             mime_type = self._get_mime_type(image_path)
             
+            # 大きすぎる画像は縮小・再エンコードして送信量を削減
+            image_data, mime_type = self._shrink_image(image_data, mime_type)
+            
             # 画像データをPartオブジェクトとして準備
             image_part = Part.from_data(
-                data=base64.b64decode(image_base64),
+                data=image_data,
                 mime_type=mime_type
             )
             
@@ -116,33 +562,32 @@ class GeminiProcessor:
             logger.error(f"画像準備エラー: {image_path} - {e}")
             return None
     
-    def _encode_image_to_base64(self, image_path: str) -> Optional[str]:
-        """画像をBase64エンコード"""
+    def _read_image_bytes(self, image_path: str) -> Optional[bytes]:
+        """画像ファイルをバイト列として読み込み"""
         try:
-            with open(image_path, "rb") as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-                logger.debug(f"画像エンコード完了: {image_path}")
-                return encoded_string
+            data = Path(image_path).read_bytes()
+            logger.debug(f"画像読み込み完了: {image_path}")
+            return data
         except Exception as e:
-            logger.error(f"画像エンコードエラー: {image_path} - {e}")
+            logger.error(f"画像読み込みエラー: {image_path} - {e}")
             return None
     
+    def _shrink_image(self, image_data: bytes, mime_type: str) -> Tuple[bytes, str]:
+        """MAX_IMAGE_SIZEを超える画像やサイズの大きい画像をJPEGに縮小・再エンコード"""
+        return shrink_image(image_data, mime_type, config.MAX_IMAGE_SIZE)
+    
     def _get_mime_type(self, image_path: str) -> str:
         """ファイル拡張子からMIMEタイプを判定"""
-        path = Path(image_path)
-        suffix = path.suffix.lower()
-        mime_map = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif'
-        }
-        return mime_map.get(suffix, 'image/jpeg')
+        return get_mime_type(Path(image_path).suffix)
 
 
 def is_available() -> bool:
-    """Vertex AIが利用可能かチェック"""
-    return VERTEX_AI_AVAILABLE
+    """Vertex AIが利用可能かチェック（初回呼び出し時にパッケージを読み込む）"""
+    try:
+        _import_vertex_ai()
+    except ImportError:
+        return False
+    return True
 
 
 def get_version() -> Optional[str]:
@@ -4,20 +4,102 @@
 画像ファイルの妥当性チェック
 """
 
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Tuple
 from PIL import Image
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 拡張子とMIMEタイプの対応表（PillowとAnkiがそのまま扱える画像形式）
+MIME_TYPES = MappingProxyType({
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.bmp': 'image/bmp',
+    '.webp': 'image/webp',
+})
+
+# フォルダ走査時の拡張子判定用（ドットなし・小文字）と表示用の形式一覧
+SUPPORTED_EXTENSIONS = frozenset(suffix[1:] for suffix in MIME_TYPES)
+SUPPORTED_FORMATS_LABEL = ", ".join(suffix[1:].upper() for suffix in MIME_TYPES)
+
+# 画像形式ごとのマジックバイト（拡張子 → ファイル先頭にマッチするパターン）
+_JPEG_SIGNATURE = re.compile(rb'\xff\xd8\xff')
+_SIGNATURES = {
+    '.jpg': _JPEG_SIGNATURE,
+    '.jpeg': _JPEG_SIGNATURE,
+    '.png': re.compile(rb'\x89PNG\r\n\x1a\n'),
+    '.gif': re.compile(rb'GIF8[79]a'),
+    '.bmp': re.compile(rb'BM'),
+    '.webp': re.compile(rb'RIFF.{4}WEBP', re.DOTALL),
+}
+_HEADER_SIZE = 16
+
+# この数以上の画像がある場合は並列で検証
+PARALLEL_VALIDATION_THRESHOLD = 8
+
+# このバイト数を超える画像は、寸法が上限内でもJPEGに再エンコード
+REENCODE_SIZE_THRESHOLD = 1_000_000
+REENCODE_JPEG_QUALITY = 85
+
+
+def has_supported_extension(name: str) -> bool:
+    """ファイル名の拡張子が処理対象の画像形式かを判定"""
+    dot = name.rfind('.')
+    return dot > 0 and name[dot + 1:].lower() in SUPPORTED_EXTENSIONS
+
+
+@lru_cache(maxsize=16)
+def get_mime_type(suffix: str) -> str:
+    """拡張子からMIMEタイプを判定"""
+    return MIME_TYPES.get(suffix.lower(), 'application/octet-stream')
+
+
+def shrink_image(image_data: bytes, mime_type: str, max_dim: int) -> Tuple[bytes, str]:
+    """max_dimを超える画像やサイズの大きい画像をJPEGに縮小・再エンコード（不要なら元のまま返す）"""
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            # Image.openはヘッダーのみ読み込むため、小さい画像はデコードせずにそのまま返す
+            if max(img.size) <= max_dim and len(image_data) <= REENCODE_SIZE_THRESHOLD:
+                return image_data, mime_type
+            
+            original_size = img.size
+            img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG', quality=REENCODE_JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        logger.warning(f"画像の縮小に失敗したため元の画像を使用: {e}")
+        return image_data, mime_type
+    
+    resized = buffer.getvalue()
+    if len(resized) >= len(image_data) and max(original_size) <= max_dim:
+        return image_data, mime_type
+    
+    logger.debug(f"画像を縮小: {original_size} → {img.size}, {len(image_data)} → {len(resized)} bytes")
+    return resized, 'image/jpeg'
+
 
 class ImageValidator:
     """画像検証クラス"""
     
-    def __init__(self, max_size_mb: int = 10):
-        """初期化"""
+    def __init__(self, max_size_mb: int = 10, strict: bool = False):
+        """初期化（strict=TrueでPILによる完全検証を常に行う）"""
         self.max_size_bytes = max_size_mb * 1024 * 1024
-        self.supported_formats = {'.jpg', '.jpeg', '.png', '.gif', '.bmp'}
+        self.strict = strict
+        self.supported_formats = frozenset(MIME_TYPES)
+        # (パス, 更新時刻, サイズ) → 検証結果 のキャッシュ（変更のないファイルは再検証しない）
+        self._cache: Dict[Tuple[str, int, int], bool] = {}
     
     def validate_image(self, image_path: str) -> bool:
         """画像ファイルの妥当性をチェック"""
@@ -25,35 +107,61 @@ class ImageValidator:
             path = Path(image_path)
             
             # ファイル存在チェック
-            if not path.exists():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
                 logger.error(f"ファイルが見つかりません: {image_path}")
                 return False
             
-            # ファイルサイズチェック
-            file_size = path.stat().st_size
-            if file_size > self.max_size_bytes:
-                logger.error(f"ファイルサイズが大きすぎます（{self.max_size_bytes/1024/1024:.0f}MB超過）: {image_path}")
-                return False
+            cache_key = (str(path), stat.st_mtime_ns, stat.st_size)
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
             
-            # 拡張子チェック
-            if path.suffix.lower() not in self.supported_formats:
-                logger.error(f"サポートされていない画像形式: {image_path}")
-                return False
-                
-            # 画像形式チェック
-            try:
-                with Image.open(image_path) as img:
-                    img.verify()
-                logger.debug(f"画像検証OK: {image_path}")
-                return True
-            except Exception as e:
-                logger.error(f"画像形式エラー: {image_path} - {e}")
-                return False
+            result = self._validate_uncached(path, stat.st_size)
+            self._cache[cache_key] = result
+            return result
                 
         except Exception as e:
             logger.error(f"画像検証エラー: {image_path} - {e}")
             return False
     
+    def _validate_uncached(self, path: Path, file_size: int) -> bool:
+        """キャッシュを使わずに画像ファイルを検証"""
+        # ファイルサイズチェック
+        if file_size > self.max_size_bytes:
+            logger.error(f"ファイルサイズが大きすぎます（{self.max_size_bytes/1024/1024:.0f}MB超過）: {path}")
+            return False
+        
+        # 拡張子チェック
+        if path.suffix.lower() not in self.supported_formats:
+            logger.error(f"サポートされていない画像形式: {path}")
+            return False
+            
+        # 画像形式チェック（先頭バイトが拡張子と一致すれば高速に判定）
+        if not self.strict and self._matches_signature(path):
+            logger.debug(f"画像検証OK（ヘッダー判定）: {path}")
+            return True
+        
+        try:
+            with Image.open(path) as img:
+                img.verify()
+            logger.debug(f"画像検証OK: {path}")
+            return True
+        except Exception as e:
+            logger.error(f"画像形式エラー: {path} - {e}")
+            return False
+    
+    def _matches_signature(self, path: Path) -> bool:
+        """ファイル先頭のマジックバイトが拡張子の形式と一致するか判定"""
+        signature = _SIGNATURES.get(path.suffix.lower())
+        if signature is None:
+            return False
+        
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER_SIZE)
+        return signature.match(header) is not None
+    
     def get_valid_images(self, folder_path: str) -> list:
         """フォルダ内の有効な画像ファイル一覧を取得（ファイル名昇順）"""
         folder = Path(folder_path)
@@ -62,12 +170,23 @@ class ImageValidator:
             logger.error(f"フォルダが見つかりません: {folder_path}")
             return []
         
-        valid_images = []
+        # scandirのDirEntryはディレクトリ読み込み時の情報を持つため、追加のstatが不要
+        supported_formats = self.supported_formats
+        with os.scandir(folder) as entries:
+            candidates = [
+                folder / entry.name for entry in entries
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in supported_formats
+            ]
+        
+        # 検証はI/O待ちが中心のため、ファイル数が多い場合はスレッドで並列実行
+        if len(candidates) < PARALLEL_VALIDATION_THRESHOLD:
+            results = [self.validate_image(str(file_path)) for file_path in candidates]
+        else:
+            max_workers = min(32, (os.cpu_count() or 1) * 4)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(self.validate_image, map(str, candidates)))
         
-        for file_path in folder.iterdir():
-            if file_path.is_file() and file_path.suffix.lower() in self.supported_formats:
-                if self.validate_image(str(file_path)):
-                    valid_images.append(file_path)
+        valid_images = [file_path for file_path, ok in zip(candidates, results) if ok]
         
         # ファイル名で昇順ソート
         valid_images.sort(key=lambda x: x.name.lower())
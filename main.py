@@ -5,19 +5,20 @@ Anki画像解説カード生成ツール (リファクタリング版)
 """
 
 import os
-import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import logging
+from logging.handlers import MemoryHandler
 
 # モジュールのインポート
 try:
     from gemini_processor import GeminiProcessor, is_available as gemini_available
     from anki_builder import AnkiCardBuilder
     from image_validator import ImageValidator
-    from batch_processor import BatchProcessor, BatchJobManager, BATCH_PROCESSING_AVAILABLE
+    from batch_processor import BatchProcessor, BatchJobManager, BATCH_PROCESSING_AVAILABLE, extract_response_text
     from monitoring import PerformanceMonitor, ResourceChecker, BatchCostCalculator
     from exceptions import ConfigurationError, AnkiGeneratorError
 except ImportError as e:
@@ -27,18 +28,25 @@ except ImportError as e:
 
 import config
 
-# ログ設定
+# ログ設定（ファイルへは100件ごと、またはERROR以上の発生時・終了時にまとめて書き込む）
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+_file_handler = logging.FileHandler('anki_generator.log', encoding='utf-8')
+_file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler('anki_generator.log', encoding='utf-8'),
+        MemoryHandler(capacity=100, flushLevel=logging.ERROR, target=_file_handler),
         logging.StreamHandler()
     ]
 )
 
 logger = logging.getLogger(__name__)
 
+# バッチジョブの作成・状態確認を並列に行う最大数
+BATCH_JOB_WORKERS = 8
+
 
 class AnkiCardGenerator:
     """Anki カード生成メインクラス（リファクタリング版）"""
@@ -97,10 +105,11 @@ class AnkiCardGenerator:
             else:
                 logger.info("リアルタイム処理モード")
     
-    def process_images_folder(self, images_folder_path: str) -> List[str]:
-        """画像フォルダ内の全画像を処理"""
+    def process_images_folder(self, images_folder_path: str, image_files: Optional[List[Path]] = None) -> List[str]:
+        """画像フォルダ内の全画像を処理（検証済みのimage_filesを渡した場合は再検証しない）"""
         # 有効な画像ファイルを取得
-        image_files = self.image_validator.get_valid_images(images_folder_path)
+        if image_files is None:
+            image_files = self.image_validator.get_valid_images(images_folder_path)
         
         if not image_files:
             logger.warning("処理可能な画像ファイルが見つかりません。")
@@ -124,26 +133,31 @@ class AnkiCardGenerator:
         # 画像ファイルを名前で昇順ソート（確実に順序を保証）
         sorted_image_files = sorted(image_files, key=lambda x: x.name.lower())
         
+        # パス文字列とファイル名は各段階で繰り返し使うため一度だけ計算
+        image_paths = [str(p) for p in sorted_image_files]
+        image_names = [p.name for p in sorted_image_files]
+        total = len(image_paths)
+        
+        # Geminiで解説生成（API呼び出しはMAX_CONCURRENCYまで並列、結果は入力順）
+        logger.info(f"解説生成中: {total}個（同時実行数 {config.MAX_CONCURRENCY}）")
+        if config.MULTI_IMAGE_CHUNK_SIZE > 1:
+            # 複数画像を1リクエストにまとめて送信
+            descriptions = self.gemini.generate_descriptions_bulk(image_paths)
+        else:
+            descriptions = self.gemini.iter_descriptions(image_paths)
+        
         media_files = []
         
-        for i, image_path in enumerate(sorted_image_files, 1):
-            logger.info(f"処理中 ({i}/{len(sorted_image_files)}): {image_path.name}")
-            
-            # Geminiで解説生成
-            description = self.gemini.generate_description(str(image_path))
-            
-            # Ankiカード作成
-            image_filename = self.anki_builder.create_card(str(image_path), description)
+        # Ankiカード作成はメインスレッドで順番に行い、後続の画像の解説生成と並行させる
+        for i, (image_path, image_name, description) in enumerate(zip(image_paths, image_names, descriptions), 1):
+            image_filename = self.anki_builder.create_card(image_path, description)
             
+            # 1画像につき1行だけ出力
             if image_filename:
-                media_files.append(str(image_path))
-                logger.info(f"  ✓ 完了: {image_path.name}")
+                media_files.append(image_path)
+                logger.info(f"  ✓ 完了 ({i}/{total}): {image_name}")
             else:
-                logger.error(f"  ✗ 失敗: {image_path.name}")
-            
-            # API制限対策：少し待機
-            if i < len(image_files):
-                time.sleep(config.API_WAIT_TIME)
+                logger.error(f"  ✗ 失敗 ({i}/{total}): {image_name}")
         
         logger.info(f"リアルタイム処理完了: {len(media_files)}/{len(image_files)} ファイル")
         return media_files
@@ -153,28 +167,63 @@ class AnkiCardGenerator:
         logger.info(f"バッチ処理を開始します（{len(image_files)}個の画像）")
         
         try:
-            # 1. バッチリクエスト準備
-            batch_requests = self.batch_processor.prepare_batch_requests(image_files)
+            # 0. 解説がキャッシュ済みの画像はバッチに含めない（カード作成時にキャッシュから補完）
+            uncached_files = [
+                image_path for image_path in image_files
+                if not self._get_cached_description(image_path)
+            ]
+            if not uncached_files:
+                logger.info("全画像の解説がキャッシュ済みのため、バッチジョブを作成せずにカードを作成します")
+                return self._create_cards_from_batch_results([], image_files)
+            if len(uncached_files) < len(image_files):
+                logger.info(f"キャッシュ済みの画像を除外してバッチ処理: {len(uncached_files)}/{len(image_files)}個")
+            
+            # 大量の画像はBATCH_MAX_SIZEごとに分割し、複数のジョブとして並列に送信
+            sorted_files = sorted(uncached_files, key=lambda x: x.name.lower())
+            chunk_size = max(1, config.BATCH_MAX_SIZE)
+            chunks = [sorted_files[i:i + chunk_size] for i in range(0, len(sorted_files), chunk_size)]
+            if len(chunks) > 1:
+                logger.info(f"{len(sorted_files)}個の画像を{len(chunks)}個のバッチジョブに分割して送信します")
             
-            # 2. バッチ入力をアップロード
-            input_uri = self.batch_processor.upload_batch_input(batch_requests)
+            # キャッシュ済みの画像は最初に記録するジョブの結果処理時にキャッシュから補完
+            submitted = set(uncached_files)
+            cached_files = [image_path for image_path in image_files if image_path not in submitted]
+            
+            job_ids: List[Optional[str]] = [None] * len(chunks)
+            failed_chunks = []
+            with ThreadPoolExecutor(max_workers=min(len(chunks), BATCH_JOB_WORKERS)) as executor:
+                futures = {executor.submit(self._submit_batch_job, chunk): index for index, chunk in enumerate(chunks)}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        job_ids[index] = future.result()
+                    except Exception as e:
+                        logger.error(f"バッチジョブ送信エラー（{index + 1}/{len(chunks)}個目）: {e}")
+                        failed_chunks.append(index)
+                        continue
+                    
+                    # 作成できたジョブから直ちに記録（他のジョブの送信失敗や待機中のエラーで失われないように）
+                    self.job_manager.save_job_info(job_ids[index], chunks[index] + cached_files)
+                    cached_files = []
             
-            # 3. バッチジョブ作成
-            job_id = self.batch_processor.create_batch_job(input_uri, config.MODEL_NAME)
+            if failed_chunks:
+                created_count = len(chunks) - len(failed_chunks)
+                failed_images = sum(len(chunks[index]) for index in failed_chunks)
+                raise RuntimeError(
+                    f"{len(failed_chunks)}/{len(chunks)}個のバッチジョブの送信に失敗しました（{failed_images}個の画像）。"
+                    f"作成済みの{created_count}個のジョブは記録済みです（python process_batch.py で処理）"
+                )
             
-            # 4. 設定に応じて待機または手動処理
+            # 設定に応じて待機または手動処理
             if config.BATCH_WAIT_FOR_COMPLETION:
-                results = self.batch_processor.wait_for_completion(job_id)
-                media_files = self._create_cards_from_batch_results(results, image_files)
-                logger.info(f"バッチ処理完了: {len(media_files)}個のカード生成")
-                return media_files
-            else:
-                # 手動実行モード
-                self.job_manager.save_job_info(job_id, image_files)
-                logger.info("バッチジョブを送信しました。完了後に手動で結果を処理してください。")
+                return self._wait_for_batch_jobs(job_ids, image_files)
+            
+            # 手動実行モード
+            logger.info("バッチジョブを送信しました。完了後に手動で結果を処理してください。")
+            for job_id in job_ids:
                 logger.info(f"ジョブID: {job_id}")
-                logger.info("完了確認: python process_batch.py")
-                return []  # 手動実行なのでメディアファイルは空
+            logger.info("完了確認: python process_batch.py")
+            return []  # 手動実行なのでメディアファイルは空
                 
         except ImportError as e:
             # パッケージが利用できない場合のみフォールバック（強制モードでない場合）
@@ -197,53 +246,116 @@ class AnkiCardGenerator:
                 logger.info("バッチ処理が失敗しました。エラーを確認してください。")
                 raise e
     
-    def _create_cards_from_batch_results(self, results: List[Dict[str, Any]], image_files: List[Path]) -> List[str]:
-        """バッチ処理結果からAnkiカードを作成（画像ファイル名昇順）"""
+    def _wait_for_batch_jobs(self, job_ids: List[str], image_files: List[Path]) -> List[str]:
+        """全ジョブの完了を待ってカードを作成（失敗・タイムアウトしたジョブは記録に残しprocess_batch.pyに任せる）"""
+        results = []
+        finished_job_ids = set()
+        with ThreadPoolExecutor(max_workers=min(len(job_ids), BATCH_JOB_WORKERS)) as executor:
+            futures = {executor.submit(self.batch_processor.wait_for_completion, job_id): job_id for job_id in job_ids}
+            for future in as_completed(futures):
+                job_id = futures[future]
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    logger.error(f"バッチジョブ待機エラー {job_id}: {e}")
+                    continue
+                finished_job_ids.add(job_id)
+        
+        # 結果を取得できたジョブは記録から除き、process_batch.pyで重複処理しないようにする
+        if finished_job_ids:
+            remaining_jobs = [job_info for job_info in self.job_manager.get_pending_jobs()
+                              if job_info["job_id"] not in finished_job_ids]
+            self.job_manager.update_jobs(remaining_jobs)
+        if len(finished_job_ids) < len(job_ids):
+            logger.warning(f"{len(job_ids) - len(finished_job_ids)}個のジョブの結果を取得できませんでした。"
+                           f"未完了のジョブは python process_batch.py で処理できます")
+        
+        media_files = self._create_cards_from_batch_results(results, image_files)
+        logger.info(f"バッチ処理完了: {len(media_files)}個のカード生成")
+        return media_files
+    
+    def _submit_batch_job(self, image_files: List[Path]) -> str:
+        """画像群を1つのバッチジョブとして送信し、ジョブIDを返す"""
+        # 1. バッチリクエスト準備
+        batch_requests = self.batch_processor.prepare_batch_requests(image_files)
+        
+        # 2. バッチ入力をアップロード
+        input_uri = self.batch_processor.upload_batch_input(batch_requests)
+        
+        # 3. バッチジョブ作成
+        return self.batch_processor.create_batch_job(input_uri, config.MODEL_NAME)
+    
+    def _get_cached_description(self, image_path: Path) -> Optional[str]:
+        """画像の解説がキャッシュ済みなら返す"""
+        if self.gemini.result_cache is None:
+            return None
+        key = self.gemini.description_key(str(image_path))
+        if key is None:
+            return None
+        return self.gemini.get_cached_description(key)
+    
+    def _create_cards_from_batch_results(self, results: List[Dict[str, Any]], image_files: List[Path],
+                                         anki_builder: Optional[AnkiCardBuilder] = None) -> List[str]:
+        """バッチ処理結果からAnkiカードを作成（画像ファイル名昇順）
+        
+        バッチに含めなかった画像（キャッシュ済み・同一内容の重複）は内容キーで解説を補完する。
+        anki_builder省略時はself.anki_builderにカードを追加する。
+        """
+        if anki_builder is None:
+            anki_builder = self.anki_builder
         media_files = []
         
-        # 画像ファイル名をキーとした辞書を作成
-        image_dict = {img.name: img for img in image_files}
+        # 画像ファイル名をキーとした辞書を作成（ファイル名昇順で登録し、以降は挿入順で処理）
+        image_dict = {img.name: img for img in sorted(image_files, key=lambda x: x.name.lower())}
         
-        # 結果をcustomId（画像ファイル名）でソートして処理順序を保証
-        sorted_results = []
+        # customId（画像ファイル名）→ 解説文
+        descriptions = {}
         for result in results:
             custom_id = result.get("customId")
-            if custom_id and custom_id in image_dict:
-                sorted_results.append(result)
-            else:
+            if not custom_id or custom_id not in image_dict:
                 logger.warning(f"対応する画像ファイルが見つかりません: {custom_id}")
+                continue
+            
+            description = extract_response_text(result)
+            if description is None:
+                error_msg = result.get("status", "不明なエラー")
+                logger.error(f"  ✗ バッチ処理エラー {custom_id}: {error_msg}")
+                continue
+            descriptions[custom_id] = description
+        
+        # パス文字列は各段階で使うため一度だけ計算
+        path_strs = {name: str(path) for name, path in image_dict.items()}
         
-        # customId（画像ファイル名）で昇順ソート
-        sorted_results.sort(key=lambda x: x.get("customId", "").lower())
+        # 内容キー → 解説文（結果はキャッシュにも保存し、次回以降の実行で再利用）
+        keys = {name: self.gemini.description_key(path_str) for name, path_str in path_strs.items()}
+        described = {}
+        for name, description in descriptions.items():
+            key = keys[name]
+            if key is not None:
+                described[key] = description
+                self.gemini.store_description(key, description)
         
         logger.info(f"バッチ結果を画像ファイル名昇順で処理開始")
         
-        for result in sorted_results:
+        for image_name, image_path in path_strs.items():
             try:
-                # customIdから対応する画像ファイルを特定
-                custom_id = result.get("customId")
-                image_path = image_dict[custom_id]
+                description = descriptions.get(image_name)
+                key = keys[image_name]
+                if description is None and key is not None:
+                    description = described.get(key) or self.gemini.get_cached_description(key)
                 
-                if "response" in result and result["response"]:
-                    # 成功した場合
-                    response = result["response"]
-                    if "candidates" in response and response["candidates"]:
-                        candidate = response["candidates"][0]
-                        if "content" in candidate and "parts" in candidate["content"]:
-                            description = candidate["content"]["parts"][0]["text"]
-                            
-                            # Ankiカード作成
-                            image_filename = self.anki_builder.create_card(str(image_path), description)
-                            
-                            if image_filename:
-                                media_files.append(str(image_path))
-                                logger.info(f"  ✓ バッチ処理完了: {image_path.name}")
-                            else:
-                                logger.error(f"  ✗ カード作成失敗: {image_path.name}")
+                if description is None:
+                    logger.error(f"  ✗ 解説が取得できません: {image_name}")
+                    continue
+                
+                # Ankiカード作成
+                image_filename = anki_builder.create_card(image_path, description)
+                
+                if image_filename:
+                    media_files.append(image_path)
+                    logger.info(f"  ✓ バッチ処理完了: {image_name}")
                 else:
-                    # エラーの場合
-                    error_msg = result.get("status", "不明なエラー")
-                    logger.error(f"  ✗ バッチ処理エラー {image_path.name}: {error_msg}")
+                    logger.error(f"  ✗ カード作成失敗: {image_name}")
                     
             except Exception as e:
                 logger.error(f"結果処理エラー: {e}")
@@ -266,78 +378,90 @@ class AnkiCardGenerator:
         completed_jobs = []
         remaining_jobs = []
         
-        for job_info in jobs:
-            job_id = job_info["job_id"]
-            try:
-                from google.cloud import aiplatform
-                job = aiplatform.BatchPredictionJob(job_id)
-                
-                # refresh() メソッドの存在を確認してから使用
-                try:
-                    job.refresh()
-                except AttributeError:
-                    # refresh() メソッドが存在しない場合は、状態を直接取得
-                    pass
-                
-                # job.state の取得方法を改善
+        # ジョブ状態の取得はAPIの応答待ちが支配的なので全ジョブ分を並列に行う（結果の処理は順番に行う）
+        with ThreadPoolExecutor(max_workers=min(len(jobs), BATCH_JOB_WORKERS)) as executor:
+            futures = [executor.submit(self._fetch_job_state, job_info["job_id"]) for job_info in jobs]
+            
+            for job_info, future in zip(jobs, futures):
+                job_id = job_info["job_id"]
                 try:
-                    if hasattr(job, 'state'):
-                        if hasattr(job.state, 'name'):
-                            state = job.state.name
-                        else:
-                            state = str(job.state)
-                    else:
-                        # 別の方法で状態を取得
-                        state = job._gca_resource.state.name if hasattr(job._gca_resource, 'state') else "UNKNOWN"
-                except Exception:
-                    logger.warning(f"通常の方法でジョブ状態取得に失敗: {job_id}")
-                    # 代替手段を試す
-                    state = self._check_job_status_alternative(job_id)
-                
-                logger.info(f"ジョブ {job_id} の状態: {state}")
-                
-                if state == "JOB_STATE_SUCCEEDED":
-                    logger.info(f"完了ジョブを処理中: {job_id}")
-                    
-                    # 結果をダウンロード
-                    results = self.batch_processor.download_batch_results(job)
+                    job, state = future.result()
                     
-                    # Ankiカード作成
-                    image_files = [Path(path) for path in job_info["image_files"]]
-                    media_files = self._create_cards_from_batch_results(results, image_files)
+                    logger.info(f"ジョブ {job_id} の状態: {state}")
                     
-                    if media_files:
-                        # Ankiデッキをエクスポート
-                        output_dir = Path("output")
-                        output_dir.mkdir(exist_ok=True)
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        output_file = output_dir / f"anki_batch_cards_{timestamp}.apkg"
-                        self.anki_builder.export_deck(str(output_file), media_files)
+                    if state == "JOB_STATE_SUCCEEDED":
+                        logger.info(f"完了ジョブを処理中: {job_id}")
                         
-                        completed_jobs.append({
-                            "job_id": job_id,
-                            "output_file": str(output_file),
-                            "card_count": len(media_files)
-                        })
+                        # 結果をダウンロード
+                        results = self.batch_processor.download_batch_results(job)
                         
-                        logger.info(f"✅ バッチジョブ完了: {len(media_files)}枚のカード → {output_file}")
-                
-                elif state in ["JOB_STATE_FAILED", "JOB_STATE_CANCELLED"]:
-                    logger.error(f"❌ バッチジョブ失敗: {job_id} (状態: {state})")
-                else:
-                    # まだ実行中
-                    remaining_jobs.append(job_info)
-                    logger.info(f"⏳ 実行中: {job_id} (状態: {state})")
+                        # Ankiカード作成（ジョブごとに新しいデッキを使い、他のジョブのカードを混在させない）
+                        image_files = [Path(path) for path in job_info["image_files"]]
+                        anki_builder = AnkiCardBuilder()
+                        media_files = self._create_cards_from_batch_results(results, image_files, anki_builder)
+                        
+                        if media_files:
+                            # Ankiデッキをエクスポート（同じ秒に完了した複数ジョブで上書きしないようジョブIDを付与）
+                            output_dir = Path("output")
+                            output_dir.mkdir(exist_ok=True)
+                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                            job_suffix = job_id.rsplit("/", 1)[-1]
+                            output_file = output_dir / f"anki_batch_cards_{timestamp}_{job_suffix}.apkg"
+                            anki_builder.export_deck(str(output_file), media_files)
+                            
+                            completed_jobs.append({
+                                "job_id": job_id,
+                                "output_file": str(output_file),
+                                "card_count": len(media_files)
+                            })
+                            
+                            logger.info(f"✅ バッチジョブ完了: {len(media_files)}枚のカード → {output_file}")
                     
-            except Exception as e:
-                logger.error(f"ジョブ処理エラー {job_id}: {e}")
-                remaining_jobs.append(job_info)
+                    elif state in ["JOB_STATE_FAILED", "JOB_STATE_CANCELLED"]:
+                        logger.error(f"❌ バッチジョブ失敗: {job_id} (状態: {state})")
+                    else:
+                        # まだ実行中
+                        remaining_jobs.append(job_info)
+                        logger.info(f"⏳ 実行中: {job_id} (状態: {state})")
+                        
+                except Exception as e:
+                    logger.error(f"ジョブ処理エラー {job_id}: {e}")
+                    remaining_jobs.append(job_info)
         
         # 未完了のジョブ情報を更新
         self.job_manager.update_jobs(remaining_jobs)
         
         return completed_jobs
     
+    def _fetch_job_state(self, job_id: str) -> Tuple[Any, str]:
+        """バッチジョブを取得し、状態名と共に返す"""
+        from google.cloud import aiplatform
+        job = aiplatform.BatchPredictionJob(job_id)
+        
+        # refresh() メソッドの存在を確認してから使用
+        try:
+            job.refresh()
+        except AttributeError:
+            # refresh() メソッドが存在しない場合は、状態を直接取得
+            pass
+        
+        # job.state の取得方法を改善
+        try:
+            if hasattr(job, 'state'):
+                if hasattr(job.state, 'name'):
+                    state = job.state.name
+                else:
+                    state = str(job.state)
+            else:
+                # 別の方法で状態を取得
+                state = job._gca_resource.state.name if hasattr(job._gca_resource, 'state') else "UNKNOWN"
+        except Exception:
+            logger.warning(f"通常の方法でジョブ状態取得に失敗: {job_id}")
+            # 代替手段を試す
+            state = self._check_job_status_alternative(job_id)
+        
+        return job, state
+    
     def export_deck(self, output_path: str, media_files: List[str]) -> None:
         """Ankiデッキをエクスポート"""
         self.anki_builder.export_deck(output_path, media_files)
@@ -345,34 +469,17 @@ class AnkiCardGenerator:
     def _check_job_status_alternative(self, job_id: str) -> str:
         """代替手段でバッチジョブの状態を確認"""
         try:
-            import subprocess
-            import json
-            
-            # gcloud CLI を使用してジョブ状態を確認
-            cmd = [
-                "gcloud", "ai", "batch-prediction-jobs", "describe", 
-                job_id.split('/')[-1],  # ジョブIDのみを抽出
-                "--region", config.LOCATION,
-                "--format", "json"
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                job_info = json.loads(result.stdout)
-                state = job_info.get('state', 'UNKNOWN')
-                logger.info(f"gcloud CLI で取得した状態: {state}")
-                return state
-            else:
-                logger.warning(f"gcloud CLI エラー: {result.stderr}")
-                return "UNKNOWN"
+            # Job Service API を直接呼び出してジョブ状態を確認
+            state = self.batch_processor.get_job_state(job_id)
+            logger.info(f"Job Service API で取得した状態: {state}")
+            return state
                 
         except Exception as e:
-            logger.debug(f"gcloud CLI による状態確認に失敗: {e}")
+            logger.debug(f"Job Service API による状態確認に失敗: {e}")
             return "UNKNOWN"
 
-def parse_arguments():
-    """コマンドライン引数の解析"""
+def parse_arguments(argv: Optional[List[str]] = None):
+    """コマンドライン引数の解析（argv省略時はsys.argvを使用）"""
     parser = argparse.ArgumentParser(description="Anki画像解説カード生成ツール")
     
     parser.add_argument(
@@ -400,7 +507,7 @@ def parse_arguments():
         help='画像フォルダのパスを指定'
     )
     
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 def interactive_batch_selection(image_count: int) -> bool:
@@ -463,10 +570,10 @@ def check_configuration():
     return errors
 
 
-def main():
-    """メイン関数"""
+def main(argv: Optional[List[str]] = None):
+    """メイン関数（他スクリプトからはargvを渡して同一プロセス内で呼び出し可能）"""
     # コマンドライン引数解析
-    args = parse_arguments()
+    args = parse_arguments(argv)
     
     print("=== Anki画像解説カード生成ツール ===")
     logger.info("プログラム開始")
@@ -517,8 +624,8 @@ def main():
         # カード生成器を初期化
         generator = AnkiCardGenerator(use_batch_processing, force_batch)
         
-        # 画像フォルダを処理
-        media_files = generator.process_images_folder(images_folder)
+        # 画像フォルダを処理（事前チェックで検証済みの画像一覧を再利用）
+        media_files = generator.process_images_folder(images_folder, image_files)
         
         # バッチ処理手動モードの場合の特別処理
         if (generator.use_batch_processing and 
@@ -4,16 +4,16 @@
 Cloud Storageから直接結果を取得してAnkiカードを生成
 """
 
-import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 import logging
-from google.cloud import storage
 
 # 既存のモジュールをインポート
 from main import AnkiCardGenerator
 from anki_builder import AnkiCardBuilder
+from batch_processor import extract_response_text, read_jsonl_blob
 import config
 
 # ログ設定
@@ -27,23 +27,21 @@ logger = logging.getLogger(__name__)
 def download_batch_results_manual(bucket_name: str, prefix: str) -> list:
     """Cloud Storageから手動でバッチ結果をダウンロード"""
     try:
+        # 読み込みに時間がかかるため、実際にダウンロードする時点でインポート
+        from google.cloud import storage
+        
         client = storage.Client()
         bucket = client.bucket(bucket_name)
         
         results = []
-        for blob in bucket.list_blobs(prefix=prefix):
-            if blob.name.endswith('.jsonl'):
-                logger.info(f"結果ファイルをダウンロード: {blob.name}")
-                content = blob.download_as_text()
-                
-                for line in content.strip().split('\n'):
-                    if line.strip():
-                        try:
-                            result = json.loads(line)
-                            results.append(result)
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"JSON解析エラー: {e}")
-                            continue
+        blobs = [blob for blob in bucket.list_blobs(prefix=prefix) if blob.name.endswith('.jsonl')]
+        for blob in blobs:
+            logger.info(f"結果ファイルをダウンロード: {blob.name}")
+        
+        # ダウンロードはネットワーク待ちが支配的なので並列実行（mapで一覧順を維持）、各ファイルは行単位で解析
+        with ThreadPoolExecutor(max_workers=config.BATCH_DOWNLOAD_WORKERS) as executor:
+            for blob_results in executor.map(read_jsonl_blob, blobs):
+                results.extend(blob_results)
         
         logger.info(f"取得した結果数: {len(results)}")
         return results
@@ -62,21 +60,16 @@ def create_anki_cards_from_results(results: list, image_files: list) -> str:
         for result, image_path in zip(results, image_files):
             try:
                 # レスポンスから解説文を抽出
-                if "response" in result and result["response"]:
-                    response = result["response"]
-                    if "candidates" in response and response["candidates"]:
-                        candidate = response["candidates"][0]
-                        if "content" in candidate and "parts" in candidate["content"]:
-                            description = candidate["content"]["parts"][0]["text"]
-                            
-                            # Ankiカード作成
-                            image_filename = anki_builder.create_card(str(image_path), description)
-                            
-                            if image_filename:
-                                media_files.append(str(image_path))
-                                logger.info(f"✓ カード作成完了: {Path(image_path).name}")
-                            else:
-                                logger.error(f"✗ カード作成失敗: {Path(image_path).name}")
+                description = extract_response_text(result)
+                if description is not None:
+                    # Ankiカード作成
+                    image_filename = anki_builder.create_card(str(image_path), description)
+                    
+                    if image_filename:
+                        media_files.append(str(image_path))
+                        logger.info(f"✓ カード作成完了: {Path(image_path).name}")
+                    else:
+                        logger.error(f"✗ カード作成失敗: {Path(image_path).name}")
                 else:
                     logger.error(f"✗ 無効なレスポンス: {Path(image_path).name}")
                     
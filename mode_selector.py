@@ -4,14 +4,23 @@
 バッチ処理またはリアルタイム処理を直感的に選択できます
 """
 
+import argparse
+import importlib
 import sys
-import subprocess
 from pathlib import Path
 import os
-from dotenv import load_dotenv
+from env_loader import load_env, reload_env
+from monitoring import BatchCostCalculator
+from image_validator import SUPPORTED_FORMATS_LABEL, has_supported_extension
 
 # .envファイルを読み込み
-load_dotenv()
+load_env()
+
+def reload_settings():
+    """.envと設定モジュールを再読み込み（同一プロセス内の再実行で.envの変更を反映するため）"""
+    reload_env()
+    if 'config' in sys.modules:
+        importlib.reload(sys.modules['config'])
 
 def check_images():
     """画像ファイルの確認"""
@@ -19,30 +28,32 @@ def check_images():
     if not img_folder.exists():
         return []
     
-    supported_formats = {'.jpg', '.jpeg', '.png', '.gif', '.bmp'}
-    image_files = [f for f in img_folder.iterdir() 
-                   if f.is_file() and f.suffix.lower() in supported_formats]
+    # scandirのDirEntryはディレクトリ読み込み時の情報を持つため、ファイルごとのstatが不要
+    with os.scandir(img_folder) as entries:
+        image_files = [entry for entry in entries
+                       if has_supported_extension(entry.name) and entry.is_file()]
     return image_files
 
-def calculate_cost_savings(image_count):
-    """コスト削減効果を計算"""
-    # Gemini 1.5 Flash の料金 (参考値)
-    realtime_cost_per_1k_tokens = 0.000075  # USD
-    batch_cost_per_1k_tokens = 0.0000375    # USD (50% off)
-    avg_tokens_per_image = 1000  # 推定値
-    
-    total_tokens = image_count * avg_tokens_per_image
-    realtime_cost = (total_tokens / 1000) * realtime_cost_per_1k_tokens
-    batch_cost = (total_tokens / 1000) * batch_cost_per_1k_tokens
-    savings = realtime_cost - batch_cost
-    savings_percent = (savings / realtime_cost) * 100 if realtime_cost > 0 else 0
-    
-    return {
-        'realtime_cost': realtime_cost,
-        'batch_cost': batch_cost,
-        'savings': savings,
-        'savings_percent': savings_percent
-    }
+# 処理モードの選択肢（画像数に依存しないため一度だけ組み立てる）
+_MODE_MENU = """
+🚀 利用可能な処理モード:
+
+1. 🔥 バッチ処理モード
+   ├ 📉 コスト削減: 通常料金の50%
+   ├ ⚡ 効率的: 大量画像の一括処理
+   ├ 🔄 非同期処理: ジョブ送信後は待機不要
+   └ 💡 推奨: 10個以上の画像処理時
+
+2. ⚡ リアルタイム処理モード
+   ├ 🚀 即座に結果取得
+   ├ 👀 リアルタイム進捗確認
+   ├ 💸 通常料金
+   └ 💡 推奨: 少量画像または急ぎの場合
+
+3. 🔧 設定変更
+   └ .envファイルの設定を変更
+
+0. ❌ 終了"""
 
 def show_mode_selection(image_count):
     """処理モード選択画面を表示"""
@@ -51,32 +62,15 @@ def show_mode_selection(image_count):
     print(f"📊 処理対象画像数: {image_count}個")
     
     if image_count > 0:
-        cost_info = calculate_cost_savings(image_count)
+        cost_info = BatchCostCalculator().calculate_savings(image_count)
         print(f"\n💰 コスト分析:")
         print(f"   推定処理料金:")
-        print(f"   - リアルタイム処理: ${cost_info['realtime_cost']:.4f}")
-        print(f"   - バッチ処理:       ${cost_info['batch_cost']:.4f}")
-        if cost_info['savings'] > 0:
-            print(f"   - 削減額:           ${cost_info['savings']:.4f} ({cost_info['savings_percent']:.1f}%)")
+        print(f"   - リアルタイム処理: ${cost_info['realtime_cost_usd']:.4f}")
+        print(f"   - バッチ処理:       ${cost_info['batch_cost_usd']:.4f}")
+        if cost_info['savings_usd'] > 0:
+            print(f"   - 削減額:           ${cost_info['savings_usd']:.4f} ({cost_info['savings_percent']:.1f}%)")
     
-    print("\n🚀 利用可能な処理モード:")
-    print()
-    print("1. 🔥 バッチ処理モード")
-    print("   ├ 📉 コスト削減: 通常料金の50%")
-    print("   ├ ⚡ 効率的: 大量画像の一括処理")
-    print("   ├ 🔄 非同期処理: ジョブ送信後は待機不要")
-    print("   └ 💡 推奨: 10個以上の画像処理時")
-    print()
-    print("2. ⚡ リアルタイム処理モード")
-    print("   ├ 🚀 即座に結果取得")
-    print("   ├ 👀 リアルタイム進捗確認")
-    print("   ├ 💸 通常料金")
-    print("   └ 💡 推奨: 少量画像または急ぎの場合")
-    print()
-    print("3. 🔧 設定変更")
-    print("   └ .envファイルの設定を変更")
-    print()
-    print("0. ❌ 終了")
+    print(_MODE_MENU)
     
     while True:
         choice = input("\n処理モードを選択してください (0-3): ").strip()
@@ -99,8 +93,13 @@ def run_batch_mode():
     print("=" * 50)
     
     try:
-        command = [sys.executable, "main.py", "--batch"]
-        result = subprocess.run(command, check=True)
+        # 新しいPythonプロセスを起動せず、同一プロセス内でメインプログラムを実行
+        # （設定画面の案内に従って.envが編集されている場合があるため、実行前に設定を再読み込み）
+        reload_settings()
+        from main import main as run_anki_main
+        exit_code = run_anki_main(["--batch"])
+        if exit_code != 0:
+            raise RuntimeError(f"終了コード {exit_code}")
         
         print("\n✅ バッチジョブの送信が完了しました！")
         print("⏳ Google Cloudでバッチ処理が実行されます（数分〜数時間）")
@@ -112,7 +111,7 @@ def run_batch_mode():
         
         return True
         
-    except subprocess.CalledProcessError as e:
+    except (RuntimeError, SystemExit) as e:
         print(f"\n❌ バッチ処理エラー: {e}")
         return False
 
@@ -123,15 +122,20 @@ def run_realtime_mode():
     print("=" * 50)
     
     try:
-        command = [sys.executable, "main.py", "--no-batch"]
-        result = subprocess.run(command, check=True)
+        # 新しいPythonプロセスを起動せず、同一プロセス内でメインプログラムを実行
+        # （設定画面の案内に従って.envが編集されている場合があるため、実行前に設定を再読み込み）
+        reload_settings()
+        from main import main as run_anki_main
+        exit_code = run_anki_main(["--no-batch"])
+        if exit_code != 0:
+            raise RuntimeError(f"終了コード {exit_code}")
         
         print("\n✅ リアルタイム処理が完了しました！")
         print("📁 outputフォルダをチェックして、生成されたAPKGファイルをAnkiにインポートしてください")
         
         return True
         
-    except subprocess.CalledProcessError as e:
+    except (RuntimeError, SystemExit) as e:
         print(f"\n❌ リアルタイム処理エラー: {e}")
         return False
 
@@ -140,7 +144,8 @@ def show_settings():
     print("\n🔧 現在の設定:")
     print("=" * 30)
     
-    # .env設定を表示
+    # .env設定を表示（前回表示後の編集を反映）
+    reload_settings()
     project_id = os.getenv('GCP_PROJECT_ID', '未設定')
     use_batch = os.getenv('USE_BATCH_PROCESSING', 'true')
     batch_threshold = os.getenv('BATCH_THRESHOLD', '10')
@@ -156,19 +161,37 @@ def show_settings():
     
     input("\nEnterキーを押して戻る...")
 
-def main():
-    """メイン関数"""
+def parse_arguments():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(description="Ankiカード生成の処理モード選択")
+    parser.add_argument(
+        '--mode',
+        choices=['batch', 'realtime'],
+        default=None,
+        help='処理モードを指定して選択画面を省略'
+    )
+    return parser.parse_args()
+
+def main(image_files=None, mode=None):
+    """メイン関数（呼び出し元で走査済みの画像一覧があればimage_filesに、処理モードを固定する場合はmodeに渡す）"""
     try:
         # 画像ファイルチェック
-        image_files = check_images()
+        if image_files is None:
+            image_files = check_images()
         image_count = len(image_files)
         
         if image_count == 0:
             print("⚠️  警告: imgフォルダに処理可能な画像ファイルがありません")
-            print("📁 サポート形式: JPG, JPEG, PNG, GIF, BMP")
-            input("\nEnterキーを押して終了...")
+            print(f"📁 サポート形式: {SUPPORTED_FORMATS_LABEL}")
+            if mode is None:
+                input("\nEnterキーを押して終了...")
             return 1
         
+        # 処理モードが指定されている場合は選択画面を表示せずに一度だけ実行
+        if mode is not None:
+            succeeded = run_batch_mode() if mode == "batch" else run_realtime_mode()
+            return 0 if succeeded else 1
+        
         while True:
             choice = show_mode_selection(image_count)
             
@@ -203,8 +226,10 @@ def main():
 
 if __name__ == "__main__":
     try:
-        exit_code = main()
-        input("\nEnterキーを押して終了...")
+        args = parse_arguments()
+        exit_code = main(mode=args.mode)
+        if args.mode is None:
+            input("\nEnterキーを押して終了...")
         sys.exit(exit_code)
     except KeyboardInterrupt:
         print("\n\n👋 処理を中断しました")
@@ -3,6 +3,7 @@
 パフォーマンスとリソース使用状況監視モジュール
 """
 
+import os
 import time
 import psutil
 from datetime import datetime
@@ -12,6 +13,37 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# ディスク使用量の再取得間隔（秒）
+DISK_USAGE_CACHE_SECONDS = 5.0
+
+# パスごとの(取得時刻, psutil.disk_usageの結果)
+_disk_usage_cache: Dict[str, tuple] = {}
+
+
+def _cached_disk_usage(path: str):
+    """ディスク使用量を取得（DISK_USAGE_CACHE_SECONDS以内の再呼び出しは前回の結果を返す）"""
+    now = time.monotonic()
+    cached = _disk_usage_cache.get(path)
+    if cached is not None and now - cached[0] < DISK_USAGE_CACHE_SECONDS:
+        return cached[1]
+    
+    usage = psutil.disk_usage(path)
+    _disk_usage_cache[path] = (now, usage)
+    return usage
+
+
+def _walk_sizes(root: str):
+    """フォルダ以下の全ファイルサイズを順に返す（scandirで再帰的に走査）"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.stat(follow_symlinks=False).st_size
+
 
 class PerformanceMonitor:
     """パフォーマンス監視クラス"""
@@ -19,14 +51,17 @@ class PerformanceMonitor:
     def __init__(self):
         self.start_time: Optional[float] = None
         self.metrics: Dict[str, Any] = {}
+        # 自プロセスの計測に使うため一度だけ取得
+        self._process = psutil.Process()
     
     def start(self) -> None:
         """監視開始"""
         self.start_time = time.time()
+        # 初回呼び出しは基準点の記録のみ（以降はこの時点からのCPU使用率を返す）
+        self._process.cpu_percent(interval=None)
         self.metrics = {
             'start_time': datetime.now().isoformat(),
-            'start_memory': psutil.virtual_memory().percent,
-            'start_cpu': psutil.cpu_percent()
+            'start_memory_mb': round(self._process.memory_info().rss / (1024**2), 2)
         }
         logger.info("パフォーマンス監視開始")
     
@@ -42,9 +77,8 @@ class PerformanceMonitor:
         self.metrics.update({
             'end_time': datetime.now().isoformat(),
             'duration_seconds': round(duration, 2),
-            'end_memory': psutil.virtual_memory().percent,
-            'end_cpu': psutil.cpu_percent(),
-            'peak_memory': psutil.virtual_memory().percent
+            'end_memory_mb': round(self._process.memory_info().rss / (1024**2), 2),
+            'cpu_percent': self._process.cpu_percent(interval=None)
         })
         
         logger.info(f"処理完了: {duration:.2f}秒")
@@ -56,7 +90,7 @@ class PerformanceMonitor:
     
     def get_disk_usage(self, path: str = ".") -> Dict[str, float]:
         """ディスク使用量を取得"""
-        usage = psutil.disk_usage(path)
+        usage = _cached_disk_usage(path)
         return {
             'total_gb': usage.total / (1024**3),
             'used_gb': usage.used / (1024**3),
@@ -71,7 +105,7 @@ class ResourceChecker:
     @staticmethod
     def check_available_space(min_gb: float = 1.0) -> bool:
         """利用可能ディスク容量をチェック"""
-        usage = psutil.disk_usage(".")
+        usage = _cached_disk_usage(".")
         free_gb = usage.free / (1024**3)
         
         if free_gb < min_gb:
@@ -99,10 +133,9 @@ class ResourceChecker:
         total_size = 0
         file_count = 0
         
-        for file_path in folder.rglob('*'):
-            if file_path.is_file():
-                total_size += file_path.stat().st_size
-                file_count += 1
+        for size in _walk_sizes(folder_path):
+            total_size += size
+            file_count += 1
         
         total_size_mb = total_size / (1024**2)
         
@@ -122,13 +155,17 @@ class BatchCostCalculator:
         self.realtime_cost_per_1k_tokens = 0.000075  # USD
         self.batch_cost_per_1k_tokens = 0.0000375    # USD (50% off)
         self.avg_tokens_per_image = 1000  # 推定値
+        
+        # 画像1枚あたりの料金を事前計算
+        self._realtime_cost_per_image = self.avg_tokens_per_image / 1000 * self.realtime_cost_per_1k_tokens
+        self._batch_cost_per_image = self.avg_tokens_per_image / 1000 * self.batch_cost_per_1k_tokens
     
     def calculate_savings(self, image_count: int) -> Dict[str, float]:
         """コスト削減効果を計算"""
         total_tokens = image_count * self.avg_tokens_per_image
         
-        realtime_cost = (total_tokens / 1000) * self.realtime_cost_per_1k_tokens
-        batch_cost = (total_tokens / 1000) * self.batch_cost_per_1k_tokens
+        realtime_cost = image_count * self._realtime_cost_per_image
+        batch_cost = image_count * self._batch_cost_per_image
         
         savings = realtime_cost - batch_cost
         savings_percent = (savings / realtime_cost) * 100 if realtime_cost > 0 else 0
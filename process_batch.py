@@ -4,10 +4,13 @@
 完了したバッチジョブの結果からAnkiカードを生成します
 """
 
+import argparse
 import sys
+import time
 from pathlib import Path
 import logging
 from main import AnkiCardGenerator
+from batch_processor import POLL_INITIAL_INTERVAL, POLL_MAX_INTERVAL, POLL_BACKOFF_FACTOR
 
 # ログ設定
 logging.basicConfig(
@@ -22,12 +25,42 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def check_batch_status():
-    """バッチジョブの状況確認"""
+def watch_pending_jobs(generator: AnkiCardGenerator) -> list:
+    """処理待ちのジョブがなくなるまで状態を確認し、完了したジョブから順に処理"""
+    completed_jobs = []
+    if not generator.use_batch_processing:
+        return completed_jobs
+    
+    interval = POLL_INITIAL_INTERVAL
+    try:
+        while generator.job_manager.get_pending_jobs():
+            time.sleep(interval)
+            newly_completed = generator.process_completed_batch_jobs()
+            for job in newly_completed:
+                print(f"  📁 {job['output_file']} ({job['card_count']}枚)")
+            completed_jobs.extend(newly_completed)
+            
+            # 完了があった直後は他のジョブも終わりやすいため間隔を戻し、なければ指数的に延ばす
+            if newly_completed:
+                interval = POLL_INITIAL_INTERVAL
+            else:
+                interval = min(interval * POLL_BACKOFF_FACTOR, POLL_MAX_INTERVAL)
+    except KeyboardInterrupt:
+        print("\n⏹ 監視を中断しました（未完了のジョブは次回処理されます）")
+    
+    return completed_jobs
+
+
+def check_batch_status(watch: bool = False):
+    """バッチジョブの状況確認（watch=Trueの場合は全ジョブの完了まで監視）"""
     try:
         generator = AnkiCardGenerator(force_batch=False)  # バッチ処理結果処理時は強制フラグは不要
         completed_jobs = generator.process_completed_batch_jobs()
         
+        if watch:
+            print("⏳ 処理待ちのバッチジョブを監視中...（Ctrl+Cで中断）")
+            completed_jobs.extend(watch_pending_jobs(generator))
+        
         if completed_jobs:
             print(f"\n🎉 {len(completed_jobs)}個のバッチジョブが完了しました！")
             for job in completed_jobs:
@@ -43,12 +76,27 @@ def check_batch_status():
         return 0
 
 
+def parse_arguments():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(description="バッチ処理結果の手動処理")
+    
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='処理待ちのバッチジョブが完了するまで監視し、完了したものから順に処理する'
+    )
+    
+    return parser.parse_args()
+
+
 def main():
     """メイン関数"""
+    args = parse_arguments()
+    
     print("=== バッチ処理結果の手動処理 ===")
     
     try:
-        completed_count = check_batch_status()
+        completed_count = check_batch_status(watch=args.watch)
         
         if completed_count > 0:
             print(f"\n✨ {completed_count}個のバッチが正常に処理されました")
@@ -56,6 +104,7 @@ def main():
         else:
             print("\n💡 ヒント:")
             print("  - バッチジョブが完了するまでお待ちください")
+            print("  - python process_batch.py --watch で完了まで自動的に待機できます")
             print("  - Google Cloud Console でジョブ状況を確認できます")
             
     except Exception as e:
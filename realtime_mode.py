@@ -4,8 +4,6 @@
 リアルタイムでAnkiカードを生成します
 """
 
-import sys
-import subprocess
 
 def main():
     """リアルタイム処理モードでメインプログラムを実行"""
@@ -14,16 +12,18 @@ def main():
     print("=" * 60)
     
     try:
-        # リアルタイム処理モードで実行
-        command = [sys.executable, "main.py", "--no-batch"]
-        result = subprocess.run(command, check=True)
+        # リアルタイム処理モードで実行（新しいPythonプロセスを起動せず、同一プロセス内で呼び出す）
+        from main import main as run_anki_main
+        exit_code = run_anki_main(["--no-batch"])
+        if exit_code != 0:
+            raise RuntimeError(f"終了コード {exit_code}")
         
         print("\n✅ リアルタイム処理が完了しました！")
         print("📁 outputフォルダをチェックして、生成されたAPKGファイルをAnkiにインポートしてください")
         
         return 0
         
-    except subprocess.CalledProcessError as e:
+    except (RuntimeError, SystemExit) as e:
         print(f"\n❌ リアルタイム処理エラー: {e}")
         return 1
     except Exception as e:
@@ -5,10 +5,12 @@
 """
 
 import json
+import re
 import sqlite3
 import tempfile
 import zipfile
 import shutil
+import sys
 from pathlib import Path
 from datetime import datetime
 import logging
@@ -19,6 +21,9 @@ from image_validator import ImageValidator
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 画像フィールドから画像ファイル名を取り出す正規表現
+IMG_SRC_PATTERN = re.compile(r'src="([^"]+)"')
+
 
 def extract_cards_from_apkg(apkg_path: str) -> list:
     """APKGファイルからカード情報を抽出"""
@@ -26,30 +31,35 @@ def extract_cards_from_apkg(apkg_path: str) -> list:
     
     try:
         with tempfile.TemporaryDirectory() as temp_dir:
-            # APKGファイルを展開
+            # APKGファイルからSQLiteデータベースのみを展開（メディアファイルは不要）
             with zipfile.ZipFile(apkg_path, 'r') as zip_file:
-                zip_file.extractall(temp_dir)
+                if 'collection.anki2' in zip_file.namelist():
+                    zip_file.extract('collection.anki2', temp_dir)
             
             # SQLiteデータベースを読み込み
             db_path = Path(temp_dir) / 'collection.anki2'
             if db_path.exists():
                 conn = sqlite3.connect(str(db_path))
+                # 展開した一時ファイルを読むだけなので、書き込み・同期・ジャーナルファイルを使わない
+                conn.execute("PRAGMA query_only=ON")
+                conn.execute("PRAGMA synchronous=OFF")
+                conn.execute("PRAGMA journal_mode=MEMORY")
                 cursor = conn.cursor()
                 
                 # ノート（カード）情報を取得
                 cursor.execute("SELECT flds FROM notes ORDER BY id")
-                rows = cursor.fetchall()
                 
-                for fields_str, in rows:
-                    field_list = fields_str.split('\x1f')  # Ankiのフィールド区切り文字
+                # 結果をリストに溜めずに1行ずつ処理
+                for fields_str, in cursor:
+                    # Ankiのフィールド区切り文字（先頭3フィールドのみ使用するため分割数を制限）
+                    field_list = fields_str.split('\x1f', 3)
                     if len(field_list) >= 2:
                         image_field = field_list[0]  # 画像フィールド
                         description_field = field_list[1]  # 解説フィールド
                         timestamp_field = field_list[2] if len(field_list) > 2 else ""
                         
                         # 画像ファイル名を抽出
-                        import re
-                        img_match = re.search(r'src="([^"]+)"', image_field)
+                        img_match = IMG_SRC_PATTERN.search(image_field)
                         if img_match:
                             img_name = img_match.group(1)
                             cards.append({
@@ -71,11 +81,9 @@ def extract_cards_from_apkg(apkg_path: str) -> list:
 def get_sorted_image_files():
     """imgフォルダから画像ファイルをファイル名昇順で取得"""
     validator = ImageValidator()
+    # get_valid_imagesはファイル名昇順で返すため、ここでの再ソートは不要
     image_files = validator.get_valid_images("img")
     
-    # ファイル名で昇順ソート
-    image_files.sort(key=lambda x: x.name.lower())
-    
     logger.info(f"ソート済み画像ファイル数: {len(image_files)}")
     for i, img in enumerate(image_files[:10]):  # 最初の10個を表示
         logger.info(f"  {i+1:2d}. {img.name}")
@@ -92,16 +100,19 @@ def match_cards_to_images(cards: list, image_files: list) -> list:
     
     print(f"\n🔄 画像ファイル名昇順での対応:")
     
+    # 1行ずつprintせず、まとめて一度に出力
+    lines = []
     for i, image_path in enumerate(image_files):
         img_name = image_path.name
         
         if img_name in card_dict:
             card = card_dict[img_name]
             matched_pairs.append((image_path, card))
-            print(f"  {i+1:3d}. {img_name} ✓")
+            lines.append(f"  {i+1:3d}. {img_name} ✓\n")
         else:
-            print(f"  {i+1:3d}. {img_name} ❌ (対応するカードなし)")
+            lines.append(f"  {i+1:3d}. {img_name} ❌ (対応するカードなし)\n")
             # 対応するカードがない場合はスキップ
+    sys.stdout.write(''.join(lines))
     
     logger.info(f"マッチしたペア数: {len(matched_pairs)}")
     return matched_pairs
@@ -115,23 +126,20 @@ def create_ordered_apkg(matched_pairs: list) -> str:
         
         print(f"\n🎴 ファイル名昇順でAPKG作成:")
         
-        for i, (image_path, card) in enumerate(matched_pairs):
-            try:
-                # 既存の解説を使用してカードを作成
-                description = card['description']
-                
-                # Ankiカード作成
-                image_filename = anki_builder.create_card(str(image_path), description)
-                
-                if image_filename:
-                    media_files.append(str(image_path))
-                    print(f"  {i+1:3d}. ✓ {image_path.name}")
-                else:
-                    print(f"  {i+1:3d}. ✗ {image_path.name} (カード作成失敗)")
-                    
-            except Exception as e:
-                print(f"  {i+1:3d}. ✗ {image_path.name} (エラー: {e})")
-                continue
+        # 既存の解説を使用してカードをまとめて作成
+        image_filenames = anki_builder.create_cards(
+            [(str(image_path), card['description']) for image_path, card in matched_pairs]
+        )
+        
+        # 1行ずつprintせず、まとめて一度に出力
+        lines = []
+        for i, ((image_path, _), image_filename) in enumerate(zip(matched_pairs, image_filenames)):
+            if image_filename:
+                media_files.append(str(image_path))
+                lines.append(f"  {i+1:3d}. ✓ {image_path.name}\n")
+            else:
+                lines.append(f"  {i+1:3d}. ✗ {image_path.name} (カード作成失敗)\n")
+        sys.stdout.write(''.join(lines))
         
         if media_files:
             # 出力ディレクトリを作成
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+結果キャッシュモジュール
+画像内容・プロンプト・モデル名をキーにGeminiの解説文をSQLiteへ保存し、再実行時のAPI呼び出しを省略
+"""
+
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Gemini解説文の内容アドレス型キャッシュ"""
+    
+    def __init__(self, db_path: str):
+        """初期化"""
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # スレッドプールから共有されるため接続はロックで保護
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS descriptions (key TEXT PRIMARY KEY, description TEXT NOT NULL)"
+            )
+            self._conn.commit()
+    
+    @staticmethod
+    def make_key(image_data: bytes, prompt: str, model_name: str) -> str:
+        """画像データ・プロンプト・モデル名からキャッシュキーを生成"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(image_data)
+        return ResultCache._finish_key(digest, prompt, model_name)
+    
+    @staticmethod
+    def make_file_key(image_path: str, prompt: str, model_name: str) -> str:
+        """画像ファイルからキャッシュキーを生成（mmapで読み込み、make_keyと同じキーになる）"""
+        digest = hashlib.blake2b(digest_size=16)
+        with open(image_path, 'rb') as f:
+            # 空ファイルはmmapできないため、画像データなしとして扱う
+            if os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    digest.update(mm)
+        return ResultCache._finish_key(digest, prompt, model_name)
+    
+    @staticmethod
+    def _finish_key(digest, prompt: str, model_name: str) -> str:
+        """画像データのハッシュにプロンプトとモデル名を加えてキーを確定"""
+        digest.update(b'\0')
+        digest.update(prompt.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(model_name.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """キャッシュ済みの解説文を取得（なければNone）"""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT description FROM descriptions WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"キャッシュ読み込みエラー: {e}")
+            return None
+        return row[0] if row else None
+    
+    def set(self, key: str, description: str) -> None:
+        """解説文をキャッシュに保存"""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO descriptions (key, description) VALUES (?, ?)",
+                    (key, description)
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"キャッシュ書き込みエラー: {e}")
+    
+    def close(self) -> None:
+        """接続を閉じる"""
+        with self._lock:
+            self._conn.close()
@@ -10,6 +10,10 @@ import subprocess
 from pathlib import Path
 import tempfile
 import shutil
+from env_loader import load_env
+
+# パッケージインストール済みの記録（requirements.txtより新しければpipを再実行しない）
+PACKAGE_STAMP = Path(".cache/packages_installed.stamp")
 
 def check_python_version():
     """Pythonバージョンチェック"""
@@ -20,8 +24,20 @@ def check_python_version():
     print(f"✅ Python: {sys.version.split()[0]}")
     return True
 
+def _packages_up_to_date():
+    """前回のインストール以降、requirements.txtと実行中のPythonが変わっていないかを判定"""
+    try:
+        return (PACKAGE_STAMP.stat().st_mtime >= Path("requirements.txt").stat().st_mtime
+                and PACKAGE_STAMP.read_text(encoding="utf-8") == sys.executable)
+    except OSError:
+        return False
+
 def install_packages():
     """必要パッケージのインストール"""
+    if _packages_up_to_date():
+        print("✅ パッケージはインストール済みです")
+        return True
+    
     print("📦 必要なパッケージをインストールしています...")
     
     try:
@@ -29,6 +45,10 @@ def install_packages():
         result = subprocess.run([
             sys.executable, "-m", "pip", "install", "-r", "requirements.txt", "--upgrade"
         ], check=True, capture_output=True, text=True)
+        
+        # 次回以降、requirements.txtが変わるまでpipの起動を省略
+        PACKAGE_STAMP.parent.mkdir(parents=True, exist_ok=True)
+        PACKAGE_STAMP.write_text(sys.executable, encoding="utf-8")
         print("✅ パッケージインストール完了")
         return True
     except subprocess.CalledProcessError as e:
@@ -60,17 +80,18 @@ def setup_env():
     print("✅ 環境設定完了")
     return True
 
-def validate_configuration():
+def load_environment():
+    """.envファイルを一度だけ読み込み、環境変数のスナップショットを返す"""
+    load_env()
+    return dict(os.environ)
+
+def validate_configuration(env):
     """設定の詳細検証"""
     print("🔍 設定を検証しています...")
     
     try:
-        # .envファイルの読み込みテスト
-        from dotenv import load_dotenv
-        load_dotenv()
-        
-        project_id = os.getenv('GCP_PROJECT_ID')
-        credentials_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+        project_id = env.get('GCP_PROJECT_ID')
+        credentials_path = env.get('GOOGLE_APPLICATION_CREDENTIALS')
         
         # 必須設定の確認
         if not project_id or project_id == "your-gcp-project-id":
@@ -90,40 +111,38 @@ def validate_configuration():
         print(f"✅ GCPプロジェクト: {project_id}")
         return True
         
-    except ImportError:
-        print("❌ エラー: python-dotenvがインストールされていません")
-        return False
     except Exception as e:
         print(f"❌ 設定検証エラー: {e}")
         return False
 
-def check_images():
-    """画像ファイルの確認"""
+def check_images(env):
+    """画像ファイルの確認（処理可能な画像の一覧を返し、ない場合は空リスト）"""
     print("🖼️  画像ファイルを確認しています...")
     
     img_folder = Path("img")
     if not img_folder.exists():
         print("❌ エラー: imgフォルダが見つかりません")
-        return False
+        return []
     
-    supported_formats = {'.jpg', '.jpeg', '.png', '.gif', '.bmp'}
-    image_files = [f for f in img_folder.iterdir() 
-                   if f.is_file() and f.suffix.lower() in supported_formats]
+    # 対応形式はmain.pyと同じ判定を使う（Pillowはinstall_packages後に読み込める）
+    from image_validator import SUPPORTED_FORMATS_LABEL, has_supported_extension
+    
+    # scandirのDirEntryはディレクトリ読み込み時の情報を持つため、ファイルごとのstatが不要
+    with os.scandir(img_folder) as entries:
+        image_files = [entry for entry in entries
+                       if has_supported_extension(entry.name) and entry.is_file()]
     
     if not image_files:
         print("⚠️  警告: imgフォルダに処理可能な画像ファイルがありません")
-        print("   サポート形式: JPG, JPEG, PNG, GIF, BMP")
-        return False
+        print(f"   サポート形式: {SUPPORTED_FORMATS_LABEL}")
+        return []
     
     print(f"✅ 処理可能な画像: {len(image_files)}個")
     
     # バッチ処理に関する情報表示
     try:
-        from dotenv import load_dotenv
-        load_dotenv()
-        
-        batch_threshold = int(os.getenv('BATCH_THRESHOLD', '10'))
-        use_batch = os.getenv('USE_BATCH_PROCESSING', 'true').lower() == 'true'
+        batch_threshold = int(env.get('BATCH_THRESHOLD', '10'))
+        use_batch = env.get('USE_BATCH_PROCESSING', 'true').lower() == 'true'
         
         if use_batch and len(image_files) >= batch_threshold:
             print(f"💡 バッチ処理モード: {len(image_files)}個 ≥ {batch_threshold}個 → 50%コスト削減！")
@@ -139,10 +158,10 @@ def check_images():
     if len(image_files) > 5:
         print(f"   ... その他 {len(image_files) - 5}個")
     
-    return True
+    return image_files
 
-def run_main_program():
-    """メインプログラムの実行"""
+def run_main_program(image_files):
+    """メインプログラムの実行（image_filesはcheck_imagesで取得済みの画像一覧）"""
     print("\n🚀 Ankiカード生成を開始します...")
     
     # 処理モードの選択
@@ -153,19 +172,17 @@ def run_main_program():
     
     mode_choice = input("\n選択してください (1-3): ").strip()
     
-    command = [sys.executable, "main.py"]
+    main_args = []
     
     if mode_choice == "1":
-        command.append("--interactive")
+        main_args.append("--interactive")
         print("📋 インタラクティブモードで実行します...")
     elif mode_choice == "3":
         print("🔧 高度な選択ツールを起動します...")
-        try:
-            result = subprocess.run([sys.executable, "mode_selector.py"], check=True)
-            return True
-        except subprocess.CalledProcessError as e:
-            print(f"❌ 選択ツールエラー: {e}")
-            return False
+        # 新しいPythonプロセスを起動せず、同一プロセス内で選択ツールを実行
+        import mode_selector
+        # 確認済みの画像一覧を渡し、imgフォルダの再走査を省略
+        return mode_selector.main(image_files) == 0
     else:
         print("📋 設定ファイルに従って実行します...")
     
@@ -177,8 +194,11 @@ def run_main_program():
             print("❌ エラー: main.py が見つかりません")
             return False
         
-        # メインプログラム実行
-        result = subprocess.run(command, check=True)
+        # メインプログラム実行（同一プロセス内で呼び出し、インタプリタの再起動を省略）
+        from main import main as run_anki_main
+        exit_code = run_anki_main(main_args)
+        if exit_code != 0:
+            raise RuntimeError(f"終了コード {exit_code}")
         
         # 結果確認
         output_files = list(Path("output").glob("*.apkg"))
@@ -190,7 +210,7 @@ def run_main_program():
         
         return True
         
-    except subprocess.CalledProcessError as e:
+    except (RuntimeError, SystemExit) as e:
         print(f"\n❌ プログラム実行エラー: {e}")
         print("\nログファイル anki_generator.log を確認してください。")
         return False
@@ -234,11 +254,12 @@ def main():
         input("Enterキーを押して終了...")
         return 1
     
-    # 設定検証
-    config_valid = validate_configuration()
-    images_available = check_images()
+    # 設定検証（.envの読み込みはここで一度だけ行う）
+    env = load_environment()
+    config_valid = validate_configuration(env)
+    image_files = check_images(env)
     
-    if not config_valid or not images_available:
+    if not config_valid or not image_files:
         print("\n⚠️  セットアップが不完全です")
         print_setup_instructions()
         
@@ -255,7 +276,7 @@ def main():
             return 0
     
     # メインプログラム実行
-    if run_main_program():
+    if run_main_program(image_files):
         print("\n🌟 すべての処理が正常に完了しました！")
         return 0
     else: